@@ -2,6 +2,10 @@ import tkinter as tk
 from tkinter import simpledialog
 from urllib.request import urlopen
 from html.parser import HTMLParser
+import codecs
+import queue
+import threading
+import time
 
 # Memory
 class Memory:
@@ -104,24 +108,66 @@ class FileSystem:
         self.cwd.children[name] = File(name, True)
         return True
 
-# HTML title parser for the "Internet" button
+# HTML title parser for the "Internet" button. It can be fed a page in
+# pieces; done is set at </title> so the caller can stop reading there.
 class TitleParser(HTMLParser):
     def __init__(self):
         super().__init__()
         self.in_title = False
+        self.parts = []
         self.title = None
+        self.done = False
 
     def handle_starttag(self, tag, attrs):
-        if tag.lower() == "title":
+        if tag.lower() == "title" and not self.done:
             self.in_title = True
 
     def handle_data(self, data):
+        # The title text can arrive split across chunks
         if self.in_title:
-            self.title = data.strip()
+            self.parts.append(data)
 
     def handle_endtag(self, tag):
-        if tag.lower() == "title":
+        if tag.lower() == "title" and self.in_title:
             self.in_title = False
+            self.done = True
+            self.title = " ".join("".join(self.parts).split())
+
+FETCH_TIMEOUT = 10          # seconds for the connection and for each read
+FETCH_DEADLINE = 30         # seconds for the whole fetch
+FETCH_CHUNK = 4096
+FETCH_MAX_BYTES = 1 << 20   # give up on pages with no title this far in
+
+class FetchCancelled(Exception):
+    pass
+
+def fetch_title(url, cancel=None, timeout=FETCH_TIMEOUT, deadline=FETCH_DEADLINE):
+    """Read url a chunk at a time until </title>; returns the title or None.
+
+    Raises FetchCancelled once the cancel event is set, TimeoutError past the
+    deadline, and whatever urlopen raises for network errors.
+    """
+    stop_at = time.monotonic() + deadline
+    parser = TitleParser()
+    with urlopen(url, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        try:
+            decoder = codecs.getincrementaldecoder(charset)(errors="ignore")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        received = 0
+        while not parser.done and received < FETCH_MAX_BYTES:
+            if cancel is not None and cancel.is_set():
+                raise FetchCancelled()
+            if time.monotonic() > stop_at:
+                raise TimeoutError(f"no title within {deadline}s")
+            chunk = response.read1(FETCH_CHUNK)
+            if not chunk:
+                parser.feed(decoder.decode(b"", final=True))
+                break
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+    return parser.title
 
 # OS Core
 class ohiOS:
@@ -164,6 +210,13 @@ class OS_GUI:
         ]
         for text, func in actions:
             tk.Button(button_frame, text=text, command=func, width=10).pack(side="left", padx=2, pady=5)
+        self.cancel_button = tk.Button(button_frame, text="Cancel", command=self.cancel_fetch,
+                                       width=10, state="disabled")
+        self.cancel_button.pack(side="left", padx=2, pady=5)
+
+        # Title fetches run on a worker thread and report back through a queue
+        self.fetch_cancel = None
+        self.fetch_results = queue.Queue()
 
     def log(self, msg, prefix="guioutput://"):
         self.output.insert(tk.END, f"{prefix} {msg}\n")
@@ -214,17 +267,50 @@ class OS_GUI:
                 self.log(f"Error: {e}")
 
     def fetch_website_title(self):
+        if self.fetch_cancel is not None:
+            self.log("A fetch is already running.")
+            return
         url = simpledialog.askstring("Fetch Title", "Enter URL (http/https):")
         if url:
-            try:
-                with urlopen(url) as response:
-                    content = response.read().decode('utf-8', errors='ignore')
-                    parser = TitleParser()
-                    parser.feed(content)
-                    title = parser.title or "No title found"
-                    self.log(f"Title: {title}")
-            except Exception as e:
-                self.log(f"Error fetching: {e}")
+            cancel = self.fetch_cancel = threading.Event()
+            threading.Thread(target=self.fetch_worker, args=(url, cancel), daemon=True).start()
+            self.cancel_button.config(state="normal")
+            self.log(f"Fetching {url}...")
+            self.root.after(50, self.poll_fetch)
+
+    def fetch_worker(self, url, cancel):
+        try:
+            title = fetch_title(url, cancel)
+            result = f"Title: {title or 'No title found'}"
+        except FetchCancelled:
+            result = None
+        except Exception as e:
+            result = f"Error fetching: {e}"
+        self.fetch_results.put((cancel, result))
+
+    def poll_fetch(self):
+        try:
+            cancel, result = self.fetch_results.get_nowait()
+        except queue.Empty:
+            if self.fetch_cancel is not None:
+                self.root.after(50, self.poll_fetch)
+            return
+        # A cancelled worker may still report; only the current fetch counts
+        if cancel is self.fetch_cancel:
+            self.fetch_cancel = None
+            self.cancel_button.config(state="disabled")
+            if result is not None:
+                self.log(result)
+        if self.fetch_cancel is not None:
+            self.root.after(50, self.poll_fetch)
+
+    def cancel_fetch(self):
+        # The worker stops at its next chunk; until then it is just ignored
+        if self.fetch_cancel is not None:
+            self.fetch_cancel.set()
+            self.fetch_cancel = None
+            self.cancel_button.config(state="disabled")
+            self.log("Fetch cancelled.")
 
     # GUI buttons
     def run_process(self):
@@ -1,138 +1,3248 @@
-import tkinter as tk
-from tkinter import simpledialog, filedialog, messagebox
-from tkinterweb import HtmlFrame
-from html.parser import HTMLParser
-from urllib.request import urlopen
+import time
+BOOT_MARKS = [("start", time.perf_counter())]
+
+try:
+    import tkinter as tk
+    from tkinter import ttk, simpledialog, filedialog, messagebox
+except ImportError:
+    tk = None  # a server without Tk can still run the kernel with --headless
+BOOT_MARKS.append(("import tkinter", time.perf_counter()))
+# tkinterweb, urllib, html.parser, tarfile, asyncio and concurrent.futures are
+# imported where they are used, so a session that never opens the browser
+# or a tar file does not pay for them at startup
+import sys
 import random
 import io
+import os
+import copy
+import fnmatch
+import bisect
+import re
+import functools
+import itertools
+import collections
+import json
+import threading
+import queue
 import contextlib
+import contextvars
+BOOT_MARKS.append(("import stdlib", time.perf_counter()))
+
+def boot_mark(label):
+    BOOT_MARKS.append((label, time.perf_counter()))
+
+def boot_report():
+    yield f"{'phase':<20} {'ms':>8} {'total':>8}"
+    start = prev = BOOT_MARKS[0][1]
+    for label, t in BOOT_MARKS[1:]:
+        yield f"{label:<20} {(t - prev) * 1000:>8.1f} {(t - start) * 1000:>8.1f}"
+        prev = t
+    deferred = [m for m in ("tkinterweb", "urllib.request", "html.parser", "tarfile", "asyncio",
+                            "concurrent.futures")
+                if m not in sys.modules]
+    yield "not loaded: " + (", ".join(deferred) or "-")
+
+# =========================
+# V1 COMPONENTS: Memory, Process, FileSystem
+# =========================
+
+# Memory Management (from v1)
+class Memory:
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self.allocations = {}
+        self.version = 0  # bumped on every change, so views can skip unchanged polls
+        # Jobs and sessions allocate concurrently. used and version are plain
+        # ints, so monitors read them without taking the lock
+        self._lock = threading.Lock()
+
+    def allocate(self, size, pid):
+        with self._lock:
+            if self.used + size <= self.size:
+                addr = self.used
+                self.allocations[pid] = (addr, size)
+                self.used += size
+                self.version += 1
+                return addr
+            return None
+
+    def deallocate(self, pid):
+        with self._lock:
+            if pid in self.allocations:
+                _, size = self.allocations.pop(pid)
+                self.used -= size
+                self.version += 1
+                return True
+            return False
+
+    def get_info(self):
+        return {"total": self.size, "used": self.used, "free": self.size - self.used}
+
+    def snapshot(self):
+        """A copy of allocations ({pid: (addr, size)}) that is safe to iterate."""
+        with self._lock:
+            return dict(self.allocations)
+
+    def free_blocks(self):
+        """Unallocated (start, size) gaps in address order."""
+        with self._lock:
+            allocations = sorted(self.allocations.values())
+        blocks, pos = [], 0
+        for addr, size in allocations:
+            if addr > pos:
+                blocks.append((pos, addr - pos))
+            pos = max(pos, addr + size)
+        if pos < self.size:
+            blocks.append((pos, self.size - pos))
+        return blocks
+
+    def fragmentation(self):
+        """Share of free memory outside the largest free block (0 = one contiguous gap)."""
+        blocks = self.free_blocks()
+        free = sum(size for _, size in blocks)
+        return 1 - max(size for _, size in blocks) / free if free else 0.0
+
+# Process (from v1)
+class Process:
+    def __init__(self, pid, name, memory_size, owner=None):
+        self.pid = pid
+        self.name = name
+        self.memory_size = memory_size
+        self.memory_start = None
+        self.state = "Running"
+        self.owner = owner  # pid of the network session that started it; None for the host
+
+class ProcessManager:
+    def __init__(self):
+        self.processes = {}
+        self.next_pid = 1000
+        self._lock = threading.Lock()
+
+    def create(self, name, memory_size, owner=None):
+        with self._lock:
+            pid = self.next_pid
+            self.next_pid += 1
+            proc = Process(pid, name, memory_size, owner)
+            self.processes[pid] = proc
+            return proc
+
+    def terminate(self, pid):
+        with self._lock:
+            return self.processes.pop(pid, None)
+
+    def list(self):
+        return list(self.processes.values())
+
+    def get(self, pid):
+        return self.processes.get(pid)
+
+# File System (from v1)
+class File:
+    def __init__(self, name, is_dir=False):
+        self.name = name
+        self.is_dir = is_dir
+        self.content = "" if not is_dir else None
+        self.size = 0
+        self.children = {} if is_dir else None
+        # Directory aggregates: size is total bytes below, counts are recursive
+        self.file_count = 0
+        self.dir_count = 0
+        self.quota = None  # (max bytes, max files) or None
+        self.mtime = time.time()
+        # Sorted child indexes ("name", "size", "mtime"), built on first use
+        # and then kept current on every insert, delete and resize
+        self.order = {}
+
+    read_only = False
+    gen = 0  # snapshot generation that owns this node
+
+    def clone(self, gen):
+        node = copy.copy(self)
+        node.gen = gen
+        if self.children is not None:
+            node.children = dict(self.children)
+            node.order = {key: list(index) for key, index in self.order.items()}
+        return node
+
+    @staticmethod
+    def sort_key(key, child):
+        return child.name if key == "name" else (getattr(child, key), child.name)
+
+    def index(self, key):
+        if key not in self.order:
+            self.order[key] = sorted(self.sort_key(key, c) for c in self.children.values())
+        return self.order[key]
+
+    def add_child(self, node):
+        self.children[node.name] = node
+        for key, index in self.order.items():
+            bisect.insort(index, self.sort_key(key, node))
+
+    def remove_child(self, name):
+        node = self.children.pop(name)
+        for key, index in self.order.items():
+            self._drop(index, self.sort_key(key, node))
+        return node
+
+    def reindex(self, node, key, old):
+        """Move node within the key index after its size or mtime changed."""
+        index = self.order.get(key)
+        if index is not None:
+            self._drop(index, old)
+            bisect.insort(index, self.sort_key(key, node))
+
+    @staticmethod
+    def _drop(index, value):
+        i = bisect.bisect_left(index, value)
+        if i < len(index) and index[i] == value:
+            del index[i]
+
+    def iter_lines(self):
+        return (line.rstrip("\n") for line in io.StringIO(self.content))
+
+    def page(self, key="name", offset=0, limit=None, reverse=False):
+        """Children in key order; only the requested slice is materialized."""
+        index = self.index(key)
+        if reverse:
+            start = len(index) - offset
+            stop = 0 if limit is None else max(start - limit, 0)
+            keys = index[stop:start][::-1]
+        else:
+            keys = index[offset:None if limit is None else offset + limit]
+        return [self.children[k if key == "name" else k[1]] for k in keys]
+
+# Host mounts: nodes that mirror a real directory. Listings are rescanned when
+# the host directory's mtime changes; a file edited in place does not change
+# that, so file sizes and mtimes come from a fresh stat and contents are read
+# on demand. Mounted data is not part of the in-memory
+# store, so it does not count towards aggregates or quotas.
+class HostFile(File):
+    read_only = True
+
+    def __init__(self, name, host_path, st):
+        self.name = name
+        self.is_dir = False
+        self.host_path = host_path
+        self._st = st
+        self.children = None
+        self.file_count = self.dir_count = 0
+        self.quota = None
+        self.order = {}
+
+    def stat(self):
+        try:
+            self._st = os.stat(self.host_path)
+        except OSError:
+            pass  # removed on the host: keep the last values until the next rescan
+        return self._st
+
+    @property
+    def size(self):
+        return self.stat().st_size
+
+    @property
+    def mtime(self):
+        return self.stat().st_mtime
+
+    @property
+    def content(self):
+        with open(self.host_path, "rb") as fh:
+            return fh.read().decode("utf-8", errors="replace")
+
+    def iter_lines(self):
+        # Straight from disk, so a pipeline that stops early stops reading
+        with open(self.host_path, encoding="utf-8", errors="replace") as fh:
+            for line in fh:
+                yield line.rstrip("\n")
+
+class HostDir(File):
+    read_only = True
+
+    def __init__(self, name, host_path):
+        self.name = name
+        self.is_dir = True
+        self.host_path = host_path
+        self.content = None
+        self.size = 0
+        self.mtime = os.stat(host_path).st_mtime
+        self.host_mtime = None
+        self.file_count = self.dir_count = 0
+        self.quota = None
+        self.order = {}
+        self._children = None
+
+    def clone(self, gen):
+        # children is derived from the host, so copy the cached listing instead
+        node = copy.copy(self)
+        node.gen = gen
+        node._children = None if self._children is None else dict(self._children)
+        node.order = {}
+        return node
+
+    def index(self, key):
+        # Sizes and mtimes of host files change behind our back, so only the
+        # name index can be kept between calls
+        if key != "name":
+            return sorted(self.sort_key(key, c) for c in self.children.values())
+        return super().index(key)
+
+    @property
+    def children(self):
+        try:
+            mtime = os.stat(self.host_path).st_mtime_ns
+        except OSError:
+            return {}
+        if self._children is None or mtime != self.host_mtime:
+            self._scan(mtime)
+        return self._children
+
+    def _scan(self, mtime):
+        old = self._children or {}
+        children = {}
+        with os.scandir(self.host_path) as it:
+            for entry in it:
+                try:
+                    node = old.get(entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if not isinstance(node, HostDir):
+                            node = HostDir(entry.name, entry.path)
+                    elif entry.is_file():
+                        if not isinstance(node, HostFile):
+                            node = HostFile(entry.name, entry.path, entry.stat())
+                    else:
+                        continue
+                except OSError:
+                    continue
+                children[entry.name] = node
+        self._children = children
+        self.order = {}
+        self.host_mtime = mtime
+
+class QuotaExceeded(Exception):
+    pass
+
+class ReadOnly(Exception):
+    pass
+
+class RWLock:
+    """Many readers or one writer.
+
+    Writers are preferred, so a steady stream of reads cannot starve them.
+    The write side is reentrant and may also read; a thread that already
+    reads can read again without queueing behind a waiting writer, but it
+    cannot upgrade to a write.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def read(self):
+        depth = getattr(self._local, "depth", 0)
+        # Only this thread can have set _writer to its own ident
+        counted = self._writer != threading.get_ident()
+        if counted:
+            with self._cond:
+                while self._writer is not None or (self._waiting_writers and not depth):
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if counted:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+        else:
+            if getattr(self._local, "depth", 0):
+                raise RuntimeError("cannot take the write lock while holding the read lock")
+            with self._cond:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting_writers -= 1
+                self._writer, self._writer_depth = me, 1
+        try:
+            yield
+        finally:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                with self._cond:
+                    self._writer = None
+                    self._cond.notify_all()
+
+def _reads(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read():
+            return method(self, *args, **kwargs)
+    return locked
+
+def _writes(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+    return locked
+
+def _reads_iter(method):
+    # For lazy walks: the read lock is held while each item is produced, not
+    # while the caller uses it, so a caller may modify the tree between items
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read():
+            items = iter(method(self, *args, **kwargs))
+        while True:
+            with self.lock.read():
+                item = next(items, locked)
+            if item is locked:
+                return
+            yield item
+    return locked
+
+# Snapshots share structure: taking one bumps the generation so every existing
+# node becomes frozen, and the first write below a frozen node copies the path
+# from the root down to it. Unchanged subtrees stay shared between versions.
+#
+# Public methods take self.lock: lookups and walks read, anything that changes
+# the tree, mounts, snapshots or watchers writes. Internal helpers assume the
+# caller holds it.
+class FileSystem:
+    def __init__(self):
+        self.root = File("/", True)
+        # The cwd lives in a context variable, so each network session (an
+        # asyncio task) and each background job has its own
+        self._cwd = contextvars.ContextVar(f"ohios-cwd-{id(self)}", default=())
+        self.mounts = {}
+        self.gen = 0
+        self.snapshots = {}
+        self.watchers = {}
+        self.next_watch = 1
+        self._pending = {}
+        # Mutations so far, for the system monitor. Counted by the mutators, not
+        # by _emit, since one mutation emits an event per ancestor
+        self.ops = 0
+        self.lock = RWLock()
+
+    @property
+    def cwd_path(self):
+        return self._cwd.get()
+
+    @cwd_path.setter
+    def cwd_path(self, path):
+        self._cwd.set(path)
+
+    @property
+    def path_stack(self):
+        stack = self._resolve("/" + "/".join(self.cwd_path))
+        if stack is None:
+            # cwd vanished (deleted or snapshot restored), fall back to root
+            self.cwd_path = ()
+            stack = [self.root]
+        return stack
+
+    @property
+    def cwd(self):
+        return self.path_stack[-1]
+
+    def _resolve(self, path):
+        """Return the nodes from root down to path (relative to cwd), or None."""
+        stack = [self.root] if path.startswith("/") else self.path_stack
+        for part in path.split("/"):
+            if part in ("", "."):
+                continue
+            if part == "..":
+                if len(stack) > 1:
+                    stack.pop()
+                continue
+            node = stack[-1].children.get(part) if stack[-1].is_dir else None
+            if node is None:
+                return None
+            stack.append(node)
+        return stack
+
+    def _parent(self, path):
+        """Split path into (stack of its parent directory, base name)."""
+        head, _, name = path.rstrip("/").rpartition("/")
+        if not name:
+            return None, None
+        stack = self._resolve(head or ("/" if path.startswith("/") else "."))
+        if stack is None or not stack[-1].is_dir:
+            return None, None
+        return stack, name
+
+    def _path_of(self, stack):
+        return "/" + "/".join(d.name for d in stack[1:])
+
+    def _mutable(self, stack):
+        """Copy frozen nodes on stack so the whole path belongs to this generation."""
+        stack = list(stack)
+        for i, node in enumerate(stack):
+            if node.gen != self.gen:
+                node = node.clone(self.gen)
+                if i == 0:
+                    self.root = node
+                else:
+                    stack[i - 1].children[node.name] = node
+                stack[i] = node
+        return stack
+
+    def _new(self, name, is_dir=False):
+        node = File(name, is_dir)
+        node.gen = self.gen
+        return node
+
+    def _propagate(self, stack, size=0, files=0, dirs=0):
+        # O(depth): every ancestor keeps its own running totals
+        for i, d in enumerate(stack):
+            old = d.size
+            d.size += size
+            d.file_count += files
+            d.dir_count += dirs
+            if size and i:
+                stack[i - 1].reindex(d, "size", (old, d.name))
+        if self.watchers:
+            # Ancestor rows show those totals, so they change too
+            for i in range(2, len(stack) + 1):
+                self._emit("modify", self._path_of(stack[:i]))
+
+    # =========================
+    # Change notifications
+    # =========================
+
+    # Pending events are coalesced per path until flush_events() delivers them:
+    # (old, new) -> resulting event, None meaning the two cancel out.
+    _COALESCE = {
+        ("create", "modify"): "create",
+        ("create", "delete"): None,
+        ("modify", "delete"): "delete",
+        ("delete", "create"): "modify",
+    }
+
+    @_writes
+    def watch(self, path, callback, recursive=False):
+        """Call callback([(event, path), ...]) for changes below directory path."""
+        stack = self._resolve(path)
+        if stack is None or not stack[-1].is_dir:
+            return None
+        wid = self.next_watch
+        self.next_watch += 1
+        self.watchers[wid] = (self._path_of(stack), recursive, callback)
+        return wid
+
+    @_writes
+    def unwatch(self, wid):
+        return self.watchers.pop(wid, None) is not None
+
+    def _emit(self, event, path):
+        if not self.watchers:
+            return
+        old = self._pending.get(path)
+        if old is not None:
+            event = self._COALESCE.get((old, event), event)
+            if event is None:
+                del self._pending[path]
+                return
+        self._pending[path] = event
+
+    def flush_events(self):
+        """Deliver coalesced events to watchers; returns how many were pending."""
+        if not self._pending:
+            return 0
+        # Callbacks run without the lock, so they are free to use the filesystem
+        with self.lock.write():
+            events, self._pending = self._pending, {}
+            watchers = list(self.watchers.values())
+        for path, recursive, callback in watchers:
+            prefix = path.rstrip("/") + "/"
+            batch = [(event, p) for p, event in events.items()
+                     if p.startswith(prefix) and (recursive or "/" not in p[len(prefix):])]
+            if batch:
+                callback(batch)
+        return len(events)
+
+    def _check_quota(self, stack, size=0, files=0, exclude=()):
+        # Ancestors already hold their totals, so each check is a comparison
+        for i, d in enumerate(stack):
+            if d.quota is None or any(d is e for e in exclude):
+                continue
+            max_bytes, max_files = d.quota
+            path = self._path_of(stack[:i + 1])
+            if size > 0 and d.size + size > max_bytes:
+                raise QuotaExceeded(f"quota exceeded on {path}: {d.size + size}/{max_bytes} bytes")
+            if files > 0 and max_files is not None and d.file_count + files > max_files:
+                raise QuotaExceeded(f"quota exceeded on {path}: {d.file_count + files}/{max_files} files")
+
+    def _check_writable(self, stack):
+        if stack[-1].read_only:
+            raise ReadOnly(f"{self._path_of(stack)}: read-only file system")
+
+    @_writes
+    def set_quota(self, path, max_bytes, max_files=None):
+        stack = self._resolve(path)
+        if stack is None or not stack[-1].is_dir or stack[-1].read_only:
+            return False
+        stack = self._mutable(stack)
+        stack[-1].quota = None if max_bytes is None else (max_bytes, max_files)
+        self.ops += 1
+        self._emit("modify", self._path_of(stack))
+        return True
+
+    @_reads
+    def pwd(self):
+        return self._path_of(self.path_stack)
+
+    @_reads
+    def cd(self, path):
+        stack = self._resolve(path)
+        if stack is None or not stack[-1].is_dir:
+            return False
+        self.cwd_path = tuple(d.name for d in stack[1:])
+        return True
+
+    @_writes
+    def mount(self, host_path, path):
+        if not os.path.isdir(host_path):
+            return False
+        stack, name = self._parent(path)
+        if stack is None or stack[-1].read_only or name in stack[-1].children:
+            return False
+        stack = self._mutable(stack)
+        stack[-1].add_child(HostDir(name, os.path.abspath(host_path)))
+        self.ops += 1
+        self._emit("create", self._path_of(stack + [stack[-1].children[name]]))
+        self._propagate(stack, dirs=1)
+        self.mounts[self._path_of(stack + [stack[-1].children[name]])] = os.path.abspath(host_path)
+        return True
+
+    @_writes
+    def umount(self, path):
+        stack = self._resolve(path)
+        if stack is None or len(stack) < 2 or stack[-2].read_only or not isinstance(stack[-1], HostDir):
+            return False
+        return self.delete(self._path_of(stack))
+
+    @_reads
+    def stat(self, path):
+        """The node at path, or None. Its counters may be read without the lock;
+        walk its children through list_dir or under self.lock.read()."""
+        stack = self._resolve(path)
+        return stack[-1] if stack else None
+
+    @_reads
+    def list_dir(self, path=".", sort=None, offset=0, limit=None, reverse=False):
+        """List a directory; with sort/offset/limit only one page is built."""
+        stack = self._resolve(path)
+        if stack is None or not stack[-1].is_dir:
+            return []
+        d = stack[-1]
+        if sort is None and not offset and limit is None and not reverse:
+            return list(d.children.values())
+        return d.page(sort or "name", offset, limit, reverse)
+
+    @_writes
+    def create_file(self, name):
+        stack, name = self._parent(name)
+        if stack is None or name in stack[-1].children:
+            return False
+        self._check_writable(stack)
+        self._check_quota(stack, files=1)
+        stack = self._mutable(stack)
+        stack[-1].add_child(self._new(name))
+        self.ops += 1
+        self._emit("create", self._path_of(stack + [stack[-1].children[name]]))
+        self._propagate(stack, files=1)
+        return True
+
+    @_writes
+    def write_file(self, name, content):
+        stack, name = self._parent(name)
+        f = stack[-1].children.get(name) if stack else None
+        if f and not f.is_dir:
+            self._check_writable(stack + [f])
+            delta = len(content) - f.size
+            self._check_quota(stack, size=delta)
+            *stack, f = self._mutable(stack + [f])
+            old_size, old_mtime = f.size, f.mtime
+            f.content = content
+            f.size = len(content)
+            f.mtime = time.time()
+            stack[-1].reindex(f, "size", (old_size, f.name))
+            stack[-1].reindex(f, "mtime", (old_mtime, f.name))
+            self.ops += 1
+            self._emit("modify", self._path_of(stack + [f]))
+            self._propagate(stack, size=delta)
+            return True
+        return False
+
+    @_reads
+    def read_lines(self, name):
+        """Lazily iterate the lines of a file, or None if it is not a file."""
+        stack = self._resolve(name)
+        f = stack[-1] if stack else None
+        if f and not f.is_dir:
+            return f.iter_lines()
+        return None
+
+    @_writes
+    def append_file(self, name, content):
+        f = self._resolve(name)
+        if f is None or f[-1].is_dir:
+            return False
+        return self.write_file(name, f[-1].content + content)
+
+    @_reads
+    def read_file(self, name):
+        stack = self._resolve(name)
+        f = stack[-1] if stack else None
+        if f and not f.is_dir:
+            return f.content
+        return None
+
+    @_writes
+    def delete(self, name):
+        stack, name = self._parent(name)
+        if stack and name in stack[-1].children:
+            self._check_writable(stack)
+            stack = self._mutable(stack)
+            f = stack[-1].remove_child(name)
+            path = self._path_of(stack + [f])
+            self.ops += 1
+            self._emit("delete", path)
+            for mount in [m for m in self.mounts if m == path or m.startswith(path + "/")]:
+                del self.mounts[mount]
+            if f.is_dir:
+                self._propagate(stack, -f.size, -f.file_count, -f.dir_count - 1)
+            else:
+                self._propagate(stack, -f.size, -1)
+            return True
+        return False
+
+    def _target(self, src, dst):
+        """Destination (parent stack, name) for cp/mv: into dst if it is a directory."""
+        stack = self._resolve(dst)
+        if stack is not None and stack[-1].is_dir:
+            return stack, src.rstrip("/").rpartition("/")[2]
+        return self._parent(dst)
+
+    def _copy_tree(self, src, name):
+        # Explicit stack, so depth is not limited by recursion. Content strings
+        # are immutable and simply shared between original and copy.
+        top = self._new(name, src.is_dir)
+        dirs = []
+        todo = [(src, top)]
+        while todo:
+            s, d = todo.pop()
+            if not s.is_dir:
+                d.content = s.content
+                d.size = len(d.content)
+                continue
+            dirs.append(d)
+            for cname, child in s.children.items():
+                c = self._new(cname, child.is_dir)
+                d.children[cname] = c
+                todo.append((child, c))
+        # Parents were queued before their children, so reversed order is bottom-up
+        for d in reversed(dirs):
+            kids = d.children.values()
+            d.size = sum(c.size for c in kids)
+            d.file_count = sum(c.file_count if c.is_dir else 1 for c in kids)
+            d.dir_count = sum(c.dir_count + 1 for c in kids if c.is_dir)
+        return top
+
+    @_writes
+    def copy(self, src, dst):
+        src_stack = self._resolve(src)
+        stack, name = self._target(src, dst)
+        if src_stack is None or len(src_stack) < 2 or stack is None:
+            return False
+        if name in stack[-1].children:
+            return False
+        self._check_writable(stack)
+        if src_stack[-1].is_dir and self._path_of(stack + [src_stack[-1]]).startswith(
+                self._path_of(src_stack) + "/"):
+            return False
+        node = self._copy_tree(src_stack[-1], name)
+        files = node.file_count if node.is_dir else 1
+        self._check_quota(stack, size=node.size, files=files)
+        stack = self._mutable(stack)
+        stack[-1].add_child(node)
+        self.ops += 1
+        self._emit("create", self._path_of(stack + [node]))
+        self._propagate(stack, node.size, files, node.dir_count + 1 if node.is_dir else 0)
+        return True
+
+    @_writes
+    def move(self, src, dst):
+        src_parent, src_name = self._parent(src)
+        stack, name = self._target(src, dst)
+        if src_parent is None or stack is None or src_name not in src_parent[-1].children:
+            return False
+        if name in stack[-1].children:
+            return False
+        self._check_writable(src_parent)
+        self._check_writable(stack)
+        node = src_parent[-1].children[src_name]
+        src_path = self._path_of(src_parent + [node])
+        dst_path = self._path_of(stack).rstrip("/") + "/" + name
+        if dst_path.startswith(src_path + "/"):
+            return False
+        files = node.file_count if node.is_dir else 1
+        dirs = node.dir_count + 1 if node.is_dir else 0
+        # Common ancestors keep their totals; only the gaining side can go over quota
+        self._check_quota(stack, size=node.size, files=files, exclude=src_parent)
+        # Clone (the step that can fail) before the source is unlinked, but
+        # rename only after: the parent's indexes are keyed on the old name
+        if node.name != name and node.gen != self.gen:
+            node = node.clone(self.gen)
+        src_parent = self._mutable(src_parent)
+        src_parent[-1].remove_child(src_name)
+        self.ops += 1
+        self._emit("delete", src_path)
+        self._propagate(src_parent, -node.size, -files, -dirs)
+        node.name = name
+        stack = self._mutable(self._resolve(self._path_of(stack)))
+        stack[-1].add_child(node)
+        self._emit("create", dst_path)
+        self._propagate(stack, node.size, files, dirs)
+        for mount in [m for m in self.mounts if m == src_path or m.startswith(src_path + "/")]:
+            self.mounts[dst_path + mount[len(src_path):]] = self.mounts.pop(mount)
+        return True
+
+    @_reads_iter
+    def find(self, path=".", name=None, size=None, kind=None):
+        """Lazily yield (path, node) below path.
+
+        name is a glob, size a (op, bytes) pair with op one of "+", "-", "=",
+        kind "f" or "d". Directories are expanded on demand with an explicit stack.
+        """
+        stack = self._resolve(path)
+        if stack is None:
+            return
+        todo = [(self._path_of(stack), stack[-1])]
+        while todo:
+            p, node = todo.pop()
+            if (name is None or fnmatch.fnmatchcase(node.name, name)) and \
+                    (kind is None or kind == ("d" if node.is_dir else "f")) and \
+                    (size is None or self._size_matches(node.size, *size)):
+                yield p, node
+            if node.is_dir:
+                prefix = p.rstrip("/") + "/"
+                todo.extend((prefix + c.name, c) for c in reversed(list(node.children.values())))
+
+    @staticmethod
+    def _size_matches(actual, op, limit):
+        if op == "+":
+            return actual > limit
+        if op == "-":
+            return actual < limit
+        return actual == limit
+
+    @_writes
+    def mkdir(self, name):
+        stack, name = self._parent(name)
+        if stack is None or name in stack[-1].children:
+            return False
+        self._check_writable(stack)
+        stack = self._mutable(stack)
+        stack[-1].add_child(self._new(name, True))
+        self.ops += 1
+        self._emit("create", self._path_of(stack + [stack[-1].children[name]]))
+        self._propagate(stack, dirs=1)
+        return True
+
+    @_reads
+    def usage(self, path="."):
+        """Aggregated (bytes, files, dirs) for path, read straight off the node."""
+        stack = self._resolve(path)
+        if stack is None:
+            return None
+        f = stack[-1]
+        if f.is_dir:
+            return f.size, f.file_count, f.dir_count
+        return f.size, 1, 0
+
+    @_writes
+    def makedirs(self, path):
+        """mkdir -p; returns the stack down to path or None if blocked by a file."""
+        stack = [self.root] if path.startswith("/") else self.path_stack
+        for part in path.split("/"):
+            if part in ("", "."):
+                continue
+            if part == ".." and len(stack) > 1:
+                stack.pop()
+                continue
+            node = stack[-1].children.get(part)
+            if node is None:
+                if not self.mkdir(self._path_of(stack) + "/" + part):
+                    return None
+                stack = self._resolve(self._path_of(stack) + "/" + part)
+            elif not node.is_dir:
+                return None
+            else:
+                stack.append(node)
+        return stack
+
+    # =========================
+    # Glob expansion
+    # =========================
+
+    @staticmethod
+    def has_magic(text):
+        return any(c in text for c in "*?[")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _compile_glob(part):
+        return re.compile(fnmatch.translate(part)).match
+
+    def _glob_names(self, node, part):
+        """Matching child names of node in sorted order, using the name index."""
+        match = self._compile_glob(part)
+        literal = re.split(r"[*?\[]", part, maxsplit=1)[0]
+        index = node.index("name")
+        # A literal prefix narrows the scan to one contiguous run of the index
+        i = bisect.bisect_left(index, literal) if literal else 0
+        while i < len(index):
+            name = index[i]
+            if literal and not name.startswith(literal):
+                break
+            if match(name) and (part.startswith(".") or not name.startswith(".")):
+                yield name
+            i += 1
+
+    @_reads_iter
+    def glob(self, pattern):
+        """Lazily yield paths matching pattern (*, ?, [...] and ** for any depth).
+
+        A trailing / matches directories only, and is kept on the results.
+        """
+        absolute = pattern.startswith("/")
+        dirs_only = pattern.endswith("/")
+        parts = [p for p in pattern.split("/") if p and p != "."]
+        join = lambda path, name: name if not path else (path.rstrip("/") + "/" + name)
+        todo = [(self.root if absolute else self.cwd, "/" if absolute else "", 0)]
+        while todo:
+            node, path, i = todo.pop()
+            if i == len(parts):
+                if path and not dirs_only:
+                    yield path
+                elif path and node.is_dir:
+                    yield path.rstrip("/") + "/"
+                continue
+            part = parts[i]
+            last = i == len(parts) - 1 and not dirs_only
+            if not node.is_dir:
+                continue
+            if part == "**":
+                # Zero directories, or one more level keeping ** in place
+                nested = [(node, path, i + 1)]
+                for n in node.index("name"):
+                    child = node.children[n]
+                    if child.is_dir and not n.startswith("."):
+                        nested.append((child, join(path, n), i))
+                    elif last and not n.startswith("."):
+                        nested.append((child, join(path, n), i + 1))
+            elif part == "..":
+                up = join(path, "..")
+                nested = [(self._resolve(up)[-1], up, i + 1)]
+            elif not self.has_magic(part):
+                child = node.children.get(part)
+                nested = [(child, join(path, part), i + 1)] if child and (last or child.is_dir) else []
+            else:
+                nested = [(node.children[n], join(path, n), i + 1) for n in self._glob_names(node, part)
+                          if last or node.children[n].is_dir]
+            todo.extend(reversed(nested))
+
+    # =========================
+    # Tar import / export
+    # =========================
+
+    def export_tar(self, path, host_path, progress=None):
+        """Stream path into a tar file on the host, one member at a time."""
+        with self.lock.write():
+            stack = self._resolve(path)
+            if stack is None or not stack[-1].is_dir:
+                return None
+            # Freeze the tree as a snapshot would: the walk below then needs no
+            # lock, and writers meanwhile copy the nodes they change
+            self.gen += 1
+        import tarfile
+        mode = "w|gz" if host_path.endswith((".gz", ".tgz")) else "w|"
+        files = total = 0
+        with tarfile.open(host_path, mode) as tar:
+            todo = [("", stack[-1])]
+            while todo:
+                arcname, node = todo.pop()
+                nested = []
+                for name, child in sorted(node.children.items()):
+                    member = f"{arcname}/{name}" if arcname else name
+                    info = tarfile.TarInfo(member)
+                    info.mtime = int(child.mtime)
+                    if child.is_dir:
+                        info.type = tarfile.DIRTYPE
+                        info.mode = 0o755
+                        tar.addfile(info)
+                        nested.append((member, child))
+                        continue
+                    info.mode = 0o644
+                    if isinstance(child, HostFile):
+                        info.size = os.path.getsize(child.host_path)
+                        with open(child.host_path, "rb") as fh:
+                            tar.addfile(info, fh)
+                    else:
+                        data = child.content.encode("utf-8")
+                        info.size = len(data)
+                        tar.addfile(info, io.BytesIO(data))
+                    files += 1
+                    total += child.size  # the VFS's own unit (characters), as du reports it
+                    if progress and files % 500 == 0:
+                        progress(files, total)
+                todo.extend(reversed(nested))
+        return files, total
+
+    def import_tar(self, host_path, path, progress=None):
+        """Stream members of a host tar file into path (created if missing)."""
+        import tarfile
+        files = total = 0
+        # Open the archive first, so a missing or unreadable one leaves no trace
+        with tarfile.open(host_path, "r|*") as tar:
+            base = self.makedirs(path)
+            if base is None:
+                return None
+            base = self._path_of(base).rstrip("/")
+            for member in tar:
+                parts = [p for p in member.name.split("/") if p not in ("", ".", "..")]
+                if not parts:
+                    continue
+                target = base + "/" + "/".join(parts)
+                if member.isdir():
+                    self.makedirs(target)
+                    continue
+                if not member.isfile():
+                    continue
+                if self.makedirs(base + "/" + "/".join(parts[:-1])) is None:
+                    continue
+                data = tar.extractfile(member).read().decode("utf-8", errors="replace")
+                self.create_file(target)
+                self.write_file(target, data)
+                files += 1
+                total += len(data)
+                if progress and files % 500 == 0:
+                    progress(files, total)
+        return files, total
+
+    # =========================
+    # Snapshots
+    # =========================
+
+    @_writes
+    def snapshot(self, name):
+        """O(1): remember the current root and freeze it by starting a new generation."""
+        self.snapshots[name] = (self.root, dict(self.mounts), time.time())
+        self.gen += 1
+
+    @_writes
+    def restore(self, name=None):
+        """Swap in a saved root, or an empty one when name is None."""
+        old = self.root
+        if name is None:
+            self.root, self.mounts = File("/", True), {}
+        elif name in self.snapshots:
+            root, mounts, _ = self.snapshots[name]
+            self.root, self.mounts = root, dict(mounts)
+        else:
+            return False
+        # The restored tree stays frozen, so the snapshot survives later writes
+        self.gen += 1
+        self.ops += 1
+        if self.watchers:
+            kinds = {"+": "create", "-": "delete", "M": "modify"}
+            for change, path in self._diff_nodes(old, self.root, dirs=True):
+                self._emit(kinds[change], path)
+        return True
+
+    @_writes
+    def drop_snapshot(self, name):
+        return self.snapshots.pop(name, None) is not None
+
+    @_reads_iter
+    def diff(self, old, new=None):
+        """Yield (change, path) between two snapshots, new=None meaning the live tree.
+
+        Shared nodes are skipped by identity, so the cost is proportional to what
+        changed rather than to the size of the tree.
+        """
+        if old not in self.snapshots or (new is not None and new not in self.snapshots):
+            return iter(())
+        a = self.snapshots[old][0]
+        b = self.root if new is None else self.snapshots[new][0]
+        return self._diff_nodes(a, b)
+
+    def _diff_nodes(self, a, b, dirs=False):
+        # dirs=True also reports directories whose contents (and so totals) changed
+        todo = [("", a, b)]
+        while todo:
+            path, x, y = todo.pop()
+            if x is y:
+                continue
+            if dirs and path and x.is_dir and y.is_dir:
+                yield "M", path
+            if not (x.is_dir and y.is_dir):
+                if x.is_dir != y.is_dir:
+                    yield "-", path or "/"
+                    yield "+", path or "/"
+                elif x.content != y.content:
+                    yield "M", path
+                continue
+            nested = []
+            for name in sorted(x.children.keys() | y.children.keys()):
+                cx, cy = x.children.get(name), y.children.get(name)
+                if cx is None:
+                    yield "+", f"{path}/{name}"
+                elif cy is None:
+                    yield "-", f"{path}/{name}"
+                elif not (isinstance(cx, HostDir) or isinstance(cy, HostDir)):
+                    nested.append((f"{path}/{name}", cx, cy))
+            todo.extend(reversed(nested))
+
+# HTML Title Parser (from v1), defined on first use so html.parser is only
+# imported when a page title is actually needed. It can be fed a page in
+# pieces; done is set at </title> so the reader can stop there.
+@functools.lru_cache(maxsize=None)
+def title_parser_class():
+    from html.parser import HTMLParser
+
+    class TitleParser(HTMLParser):
+        def __init__(self):
+            super().__init__()
+            self.in_title = False
+            self.parts = []
+            self.title = None
+            self.done = False
+
+        def handle_starttag(self, tag, attrs):
+            if tag.lower() == "title" and not self.done:
+                self.in_title = True
+
+        def handle_data(self, data):
+            # The title text can arrive split across chunks
+            if self.in_title:
+                self.parts.append(data)
+
+        def handle_endtag(self, tag):
+            if tag.lower() == "title" and self.in_title:
+                self.in_title = False
+                self.done = True
+                self.title = " ".join("".join(self.parts).split())
+
+    return TitleParser
+
+TITLE_TIMEOUT = 10         # seconds for the connection and for each read
+TITLE_MAX_BYTES = 1 << 20  # give up on pages with no title this far in
+
+class FetchCancelled(Exception):
+    pass
+
+def fetch_title(url, timeout=TITLE_TIMEOUT, cancel=None):
+    """Read url a chunk at a time until </title>; returns the title or None.
+
+    Raises FetchCancelled once the cancel event is set, TimeoutError past
+    three timeouts in all, and whatever urlopen raises for network errors.
+    """
+    from urllib.request import urlopen
+    import codecs
+    parser = title_parser_class()()
+    deadline = time.monotonic() + timeout * 3
+    with urlopen(url, timeout=timeout) as response:
+        try:
+            decoder = codecs.getincrementaldecoder(response.headers.get_content_charset() or "utf-8")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")
+        decoder = decoder(errors="ignore")
+        received = 0
+        while not parser.done and received < TITLE_MAX_BYTES:
+            if cancel is not None and cancel.is_set():
+                raise FetchCancelled()
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no title within {timeout * 3}s")
+            chunk = response.read1(4096)
+            if not chunk:
+                parser.feed(decoder.decode(b"", final=True))
+                break
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+    return parser.title
+
+# =========================
+# V2.1 SHELL COMMANDS
+# =========================
+
+# Commands live in a table instead of an if/elif chain: dispatch is one dict
+# lookup, help is generated from the table, and plugins add entries to it.
+# Handlers take (sh, args) and yield output lines.
+
+class Command:
+    def __init__(self, name, handler, usage="", help="", min_args=0, max_args=None, expand=True,
+                 pipe=False, raw=False, local=False):
+        self.name = name
+        self.handler = handler
+        self.usage = usage or name
+        self.help = help
+        self.min_args = min_args
+        self.max_args = max_args
+        self.expand = expand  # glob-expand arguments before calling
+        self.pipe = pipe  # handler takes a third argument: the upstream line iterator
+        self.raw = raw  # gets the rest of the line untouched: no pipes, redirects or globs
+        self.local = local  # reaches the host (Python, host files, the network): not for network sessions
+
+    def accepts(self, args):
+        return len(args) >= self.min_args and (self.max_args is None or len(args) <= self.max_args)
+
+    def invoke(self, sh, args, stdin=None):
+        if not self.accepts(args):
+            raise ShellError(f"Usage: {self.usage}")
+        if self.local and not sh.trusted:
+            raise ShellError(f"{self.name}: not available to network sessions")
+        # Plugins may return a list; iter() leaves generators (and their status) as they are
+        if self.pipe:
+            return iter(self.handler(sh, args, iter(stdin or ())) or ())
+        return iter(self.handler(sh, args) or ())
+
+class ShellError(Exception):
+    """A message for the user, printed as is."""
+
+class LazyCommand:
+    """A plugin command known by name only; its code is imported on first use."""
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.usage = name
+        self.help = "(plugin)"
+
+    def load(self):
+        target = self.loader()
+        if isinstance(target, Command):
+            return target
+        # A plugin is a module with run(sh, args), or the handler itself
+        return Command(self.name, getattr(target, "run", target),
+                       getattr(target, "USAGE", self.name), getattr(target, "HELP", ""),
+                       getattr(target, "MIN_ARGS", 0), getattr(target, "MAX_ARGS", None))
+
+def load_plugin_file(path):
+    import importlib.util
+    name = "ohios_plugin_" + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class CommandRegistry:
+    def __init__(self, plugin_dirs=()):
+        self.commands = {}
+        self.plugin_dirs = list(plugin_dirs)
+        self.discovered = False
+
+    def command(self, name, usage="", help="", min_args=0, max_args=None, expand=True, pipe=False,
+                raw=False, local=False):
+        def decorator(handler):
+            self.commands[name] = Command(name, handler, usage, help, min_args, max_args, expand, pipe,
+                                          raw, local)
+            return handler
+        return decorator
+
+    def get(self, name):
+        cmd = self.commands.get(name)
+        if cmd is None and not self.discovered:
+            self.discover()
+            cmd = self.commands.get(name)
+        if isinstance(cmd, LazyCommand):
+            cmd = self.commands[name] = cmd.load()
+        return cmd
+
+    def discover(self):
+        """Register plugin names from plugin directories and entry points without importing them."""
+        self.discovered = True
+        for directory in self.plugin_dirs:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if ext == ".py" and not name.startswith("_") and name not in self.commands:
+                    self.commands[name] = LazyCommand(name, functools.partial(load_plugin_file, entry.path))
+        try:
+            from importlib.metadata import entry_points
+            plugins = entry_points(group="ohios.commands")
+        except Exception:
+            plugins = ()
+        for ep in plugins:
+            if ep.name not in self.commands:
+                self.commands[ep.name] = LazyCommand(ep.name, ep.load)
+
+    def names(self):
+        if not self.discovered:
+            self.discover()
+        return sorted(self.commands)
+
+    def help_lines(self, name=None):
+        if name is not None:
+            cmd = self.get(name)
+            if cmd is None:
+                yield f"help: no such command: {name}"
+            else:
+                yield f"{cmd.usage} - {cmd.help}"
+            return
+        yield "--- Shell Commands ---"
+        for name in self.names():
+            cmd = self.commands[name]
+            yield f"{cmd.usage} - {cmd.help}"
+        yield "Arguments may use *, ?, [...] and ** globs; quote to keep them literal"
+        yield "Pipelines: cmd1 | cmd2 | cmd3 > file (>> appends); end a line with & to run it in the background"
+        yield "Lists: a && b, a || b, a; b. Scripts (source/sh) add NAME=value, $NAME, if, for and while"
+
+PLUGIN_DIRS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins"),
+    os.path.join(os.path.expanduser("~"), ".ohios", "plugins"),
+] + [p for p in os.environ.get("OHIOS_PLUGIN_PATH", "").split(os.pathsep) if p]
+
+commands = CommandRegistry(PLUGIN_DIRS)
+
+# =========================
+# Pipelines
+# =========================
+
+OPERATORS = ("&&", "||", ">>", "|", ">", ";", "\n")
+SEPARATORS = ("&&", "||", ";", "\n")
+KEYWORDS = ("if", "then", "elif", "else", "fi", "for", "in", "do", "done", "while")
+
+def tokenize(line):
+    """Split a command line into words and operators; quotes are kept on the word.
+
+    # starts a comment, and a raw command (python) takes the rest of its
+    line as a single word.
+    """
+    tokens, word, quote = [], "", None
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if quote:
+            word += c
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            word += c
+            quote = c
+        elif c == "#" and not word:
+            end = line.find("\n", i)
+            i = len(line) if end < 0 else end
+            continue
+        elif c.isspace() and c != "\n":
+            if word:
+                tokens.append(word)
+                if getattr(commands.commands.get(word.lower()), "raw", False) and \
+                        (len(tokens) == 1 or tokens[-2] in SEPARATORS or tokens[-2] in KEYWORDS):
+                    end = line.find("\n", i)
+                    end = len(line) if end < 0 else end
+                    if line[i:end].strip():
+                        tokens.append(line[i:end].strip())
+                    i = end
+                    word = ""
+                    continue
+            word = ""
+        else:
+            op = next((op for op in OPERATORS if line.startswith(op, i)), None)
+            if op is None:
+                word += c
+            else:
+                if word:
+                    tokens.append(word)
+                word = ""
+                tokens.append(op)
+                i += len(op) - 1
+        i += 1
+    if word:
+        tokens.append(word)
+    return tokens
+
+def expand_args(fs, words):
+    """Glob-expand words against the filesystem; quoted words stay literal."""
+    expanded = words[:1]
+    for word in words[1:]:
+        if len(word) > 1 and word[0] == word[-1] and word[0] in "'\"":
+            expanded.append(word[1:-1])
+        elif fs.has_magic(word) and not word.startswith("-"):
+            # Like sh: a pattern with no matches is passed through unchanged
+            matches = list(fs.glob(word))
+            expanded.extend(matches or [word])
+        else:
+            expanded.append(word)
+    return expanded
+
+def parse_pipeline(tokens):
+    """Return ([words per stage], (">" or ">>", target) or None)."""
+    redirect = None
+    if len(tokens) >= 2 and tokens[-2] in (">", ">>"):
+        redirect = (tokens[-2], tokens[-1].strip("'\""))
+        tokens = tokens[:-2]
+    stages = [[]]
+    for token in tokens:
+        if token == "|":
+            stages.append([])
+        elif token in (">", ">>"):
+            raise ShellError("Redirection must come last")
+        else:
+            stages[-1].append(token)
+    if any(not words for words in stages):
+        raise ShellError("Syntax error near '|'")
+    return stages, redirect
+
+def pipeline(sh, stages):
+    """Chain stages as generators; nothing runs until the last one is pulled."""
+    stream = None
+    for words in stages:
+        command = commands.get(words[0].lower())
+        if command is None:
+            raise ShellError(f"Unknown command: {words[0].lower()}")
+        if command.expand:
+            words = expand_args(sh.filesystem, words)
+        stream = command.invoke(sh, words[1:], stream)
+    return stream
+
+def write_redirect(fs, redirect, stream):
+    """Drain stream into a file, returning the exit status of the stream."""
+    op, target = redirect
+    node = fs.stat(target)
+    if node is not None and node.is_dir:
+        raise ShellError(f"{target}: Is a directory")
+    if node is not None and node.read_only:
+        raise ShellError(f"{target}: read-only file system")
+    try:
+        if node is None and not fs.create_file(target):
+            raise ShellError(f"cannot create {target}")
+    except ReadOnly as e:
+        raise ShellError(str(e)) from None
+    if op == ">":
+        fs.write_file(target, "")
+    # Each append rebuilds the whole content, so collect the output and write it once
+    lines = []
+    while True:
+        try:
+            out = next(stream)
+        except StopIteration as stop:
+            status = stop.value
+            break
+        lines.append(out + "\n")
+    write = fs.write_file if op == ">" else fs.append_file
+    if lines and not write(target, "".join(lines)):
+        raise ShellError(f"{target}: write failed")
+    return status
+
+def run_line(sh, line, env=None):
+    """Run a command line or script; yields the lines that are not redirected to a file.
+
+    The generator's return value is the exit status of the last command.
+    """
+    return (yield from run_node(sh, parse_script(line), sh.variables if env is None else env))
+
+# =========================
+# Scripts
+# =========================
+
+# A script is parsed once into nested tuples:
+#   ("list", [node...])           commands separated by ; or newlines
+#   ("and"|"or", left, right)     a && b, a || b
+#   ("if", [(cond, body)...], else_body or None)
+#   ("for", name, [word...], body), ("while", cond, body)
+#   ("assign", [(name, word)...]), ("raw", words)
+#   ("cmd", [words per stage], redirect or None)
+# Words keep their $VARIABLES; they are substituted when the node runs.
+#
+# Exit status: a handler generator may return a number (0 = success); None
+# counts as 0 and a ShellError or exception as 1.
+
+ASSIGNMENT = re.compile(r"([A-Za-z_]\w*)=(.*)", re.DOTALL)
+VARIABLE = re.compile(r"\$(?:\{(\w+|[?#@])\}|(\w+|[?#@]))")
+
+class ScriptParser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, keyword):
+        token = self.take()
+        if token != keyword:
+            raise ShellError(f"syntax error: expected '{keyword}' near '{token or 'end of script'}'")
+
+    def skip_separators(self):
+        while self.peek() in (";", "\n"):
+            self.pos += 1
+
+    def parse(self):
+        node = self.parse_list()
+        if self.peek() is not None:
+            raise ShellError(f"syntax error near '{self.peek()}'")
+        return node
+
+    def parse_list(self, *terminators):
+        items = []
+        self.skip_separators()
+        while self.peek() is not None and self.peek() not in terminators:
+            items.append(self.parse_and_or())
+            if self.peek() not in (";", "\n", None) + terminators:
+                raise ShellError(f"syntax error near '{self.peek()}'")
+            self.skip_separators()
+        return ("list", items)
+
+    def parse_and_or(self):
+        node = self.parse_command()
+        while self.peek() in ("&&", "||"):
+            op = "and" if self.take() == "&&" else "or"
+            while self.peek() == "\n":
+                self.pos += 1
+            node = (op, node, self.parse_command())
+        return node
+
+    def words(self):
+        words = []
+        while self.peek() is not None and self.peek() not in SEPARATORS:
+            words.append(self.take())
+        return words
+
+    def parse_command(self):
+        token = self.peek()
+        if token == "if":
+            return self.parse_if()
+        if token == "for":
+            return self.parse_for()
+        if token == "while":
+            self.take()
+            cond = self.parse_list("do")
+            self.expect("do")
+            body = self.parse_list("done")
+            self.expect("done")
+            return ("while", cond, body)
+        if token in KEYWORDS:
+            raise ShellError(f"syntax error near '{token}'")
+        words = self.words()
+        if not words:
+            raise ShellError(f"syntax error near '{self.peek() or 'end of script'}'")
+        if getattr(commands.commands.get(words[0].lower()), "raw", False):
+            return ("raw", words)
+        assignments = [ASSIGNMENT.fullmatch(w) for w in words]
+        if all(assignments):
+            return ("assign", [m.groups() for m in assignments])
+        return ("cmd",) + parse_pipeline(words)
+
+    def parse_if(self):
+        self.take()
+        branches = []
+        while True:
+            cond = self.parse_list("then")
+            self.expect("then")
+            branches.append((cond, self.parse_list("elif", "else", "fi")))
+            token = self.take()
+            if token == "elif":
+                continue
+            if token == "else":
+                other = self.parse_list("fi")
+                self.expect("fi")
+                return ("if", branches, other)
+            if token != "fi":
+                raise ShellError(f"syntax error: expected 'fi' near '{token or 'end of script'}'")
+            return ("if", branches, None)
+
+    def parse_for(self):
+        self.take()
+        name = self.take()
+        if name is None or not re.fullmatch(r"[A-Za-z_]\w*", name):
+            raise ShellError(f"syntax error: bad for variable '{name}'")
+        self.expect("in")
+        words = self.words()
+        self.skip_separators()
+        self.expect("do")
+        body = self.parse_list("done")
+        self.expect("done")
+        return ("for", name, words, body)
+
+@functools.lru_cache(maxsize=256)
+def parse_script(text):
+    # Keyed on the text itself: an unchanged file hands back the same string
+    # object, whose hash Python keeps, so a repeated run costs one dict lookup
+    return ScriptParser(tokenize(text)).parse()
+
+def substitute(word, env):
+    """Expand $NAME and ${NAME} outside single quotes.
+
+    A word that is nothing but an unquoted variable splits on whitespace, so
+    `for f in $FILES` sees one item per name.
+    """
+    if "$" not in word:
+        return [word]
+    match = VARIABLE.fullmatch(word)
+    if match:
+        return env.get(match.group(1) or match.group(2), "").split()
+    out, quote, i = [], None, 0
+    while i < len(word):
+        c = word[i]
+        match = VARIABLE.match(word, i) if c == "$" and quote != "'" else None
+        if match:
+            out.append(env.get(match.group(1) or match.group(2), ""))
+            i = match.end()
+            continue
+        if c in "'\"":
+            quote = None if quote == c else (quote or c)
+        out.append(c)
+        i += 1
+    return ["".join(out)]
+
+def substitute_all(words, env):
+    return [part for word in words for part in substitute(word, env)]
+
+def run_node(sh, node, env):
+    kind = node[0]
+    if kind == "list":
+        status = 0
+        for item in node[1]:
+            status = yield from run_node(sh, item, env)
+        return status
+    if kind in ("and", "or"):
+        status = yield from run_node(sh, node[1], env)
+        if (status == 0) == (kind == "and"):
+            status = yield from run_node(sh, node[2], env)
+        return status
+    if kind == "if":
+        for cond, body in node[1]:
+            if (yield from run_node(sh, cond, env)) == 0:
+                return (yield from run_node(sh, body, env))
+        return (yield from run_node(sh, node[2], env)) if node[2] else 0
+    if kind == "for":
+        status = 0
+        for value in expand_args(sh.filesystem, ["for"] + substitute_all(node[2], env))[1:]:
+            if job_cancelled():
+                raise JobCancelled()
+            env[node[1]] = value
+            status = yield from run_node(sh, node[3], env)
+        return status
+    if kind == "while":
+        status = 0
+        # A loop body may never print, so kill is checked on every pass
+        while not job_cancelled() and (yield from run_node(sh, node[1], env)) == 0:
+            status = yield from run_node(sh, node[2], env)
+        if job_cancelled():
+            raise JobCancelled()
+        return status
+    if kind == "assign":
+        for name, word in node[1]:
+            value = " ".join(substitute(word, env))
+            if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            env[name] = value
+        status = 0
+    else:
+        status = yield from run_command(sh, node, env)
+    env["?"] = str(status)
+    return status
+
+def run_command(sh, node, env):
+    try:
+        if node[0] == "raw":
+            command = commands.get(node[1][0].lower())
+            status = yield from command.invoke(sh, node[1][1:])
+            return status or 0
+        stages = [substitute_all(words, env) for words in node[1]]
+        stages = [words for words in stages if words]
+        if not stages:
+            return 0
+        stream = pipeline(sh, stages)
+        if node[2] is None:
+            status = yield from stream
+        else:
+            op, target = node[2]
+            status = write_redirect(sh.filesystem, (op, "".join(substitute(target, env))), stream)
+        return status or 0
+    except ShellError as e:
+        yield str(e)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        yield f"Error: {e}"
+    return 1
+
+# =========================
+# Background Jobs
+# =========================
+
+class Job:
+    def __init__(self, job_id, line, proc):
+        self.id = job_id
+        self.line = line
+        self.proc = proc
+        self.state = "Running"
+        self.cancelled = False
+        self.future = None
+        self.reported = False
+
+class JobCancelled(Exception):
+    pass
+
+# The job a worker thread is running, set inside the job's own context;
+# Kernel.execute sets a Foreground for the command it runs
+CURRENT_JOB = contextvars.ContextVar("ohios-current-job", default=None)
+
+def job_cancelled():
+    """True once the job running the caller has been killed or interrupted.
+
+    Handlers that block between output lines poll this, since the job is
+    otherwise only stopped at its next line.
+    """
+    job = CURRENT_JOB.get()
+    return job is not None and job.cancelled
+
+class Foreground:
+    """Stands in for a Job while a frontend runs a command in the foreground.
+
+    interrupt() stops it the way kill stops a job. A frontend that runs
+    the command on its own UI thread passes poll, which is called at most
+    ten times a second while the command checks for cancellation, so a key
+    press can still get through.
+    """
+    def __init__(self, poll=None):
+        self.interrupted = False
+        self.poll = poll
+        self.next_poll = 0.0
+
+    @property
+    def cancelled(self):
+        if self.poll is not None and time.monotonic() >= self.next_poll:
+            self.next_poll = time.monotonic() + 0.1
+            self.poll()
+        return self.interrupted
+
+class JobControl:
+    """Runs command lines on a worker pool; output comes back through a queue.
+
+    Workers never touch the UI. The frontend calls drain() from its own
+    thread (Tk: root.after) to get (job, line) pairs, where line None means
+    the job has finished.
+    """
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.executor = None  # started with the first job
+        self.output = queue.Queue()
+        self.jobs = {}
+        self.next_id = 1
+
+    def submit(self, sh, line):
+        proc = sh.process_manager.create(line if len(line) <= 20 else line[:17] + "...", 0, sh.owner)
+        job = Job(self.next_id, line, proc)
+        self.next_id += 1
+        self.jobs[job.id] = job
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ohios-job")
+        # The job starts in the submitting shell's context, so it sees its cwd
+        job.future = self.executor.submit(contextvars.copy_context().run, self._run, sh, job)
+        return job
+
+    def _run(self, sh, job):
+        CURRENT_JOB.set(job)
+        try:
+            if job.cancelled:
+                raise JobCancelled()  # killed while it waited for a worker
+            stream = run_line(sh, job.line)
+            while True:
+                try:
+                    out = next(stream)
+                except StopIteration as stop:
+                    status = stop.value
+                    break
+                if job.cancelled:
+                    stream.close()
+                    raise JobCancelled()
+                self.output.put((job, out))
+            job.state = "Done" if not status else f"Exit {status}"
+        except JobCancelled:
+            job.state = "Killed"
+        except ShellError as e:
+            self.output.put((job, str(e)))
+            job.state = "Exit 1"
+        except Exception as e:
+            self.output.put((job, f"Error: {e}"))
+            job.state = "Exit 1"
+        finally:
+            sh.process_manager.terminate(job.proc.pid)
+            self.output.put((job, None))
+
+    def drain(self, limit=1000):
+        items = []
+        try:
+            while len(items) < limit:
+                items.append(self.output.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def find(self, spec=None):
+        """Look a job up by %n, job number or pid; None means the newest one."""
+        if spec is None:
+            return max(self.jobs.values(), key=lambda j: j.id, default=None)
+        spec = spec.lstrip("%")
+        if spec.isdigit():
+            n = int(spec)
+            return self.jobs.get(n) or next((j for j in self.jobs.values() if j.proc.pid == n), None)
+        return None
+
+    def cancel(self, job):
+        # Cooperative: the pipeline stops at its next output line or loop pass.
+        # A queued job still starts, so that it is reported as killed
+        job.cancelled = True
+
+    def forget_reported(self):
+        for job_id in [j.id for j in self.jobs.values() if j.state != "Running" and j.reported]:
+            del self.jobs[job_id]
+
+# =========================
+# History and Completion
+# =========================
+
+HISTORY_FILE = os.environ.get("OHIOS_HISTFILE") or os.path.join(os.path.expanduser("~"), ".ohios", "history")
+
+class History:
+    """Command history, appended to a file as it grows.
+
+    Every entry's trigrams are indexed, so a reverse search only looks at
+    entries that share the query's rarest trigram instead of the whole list.
+    The index is built on the first search, not at startup.
+    """
+    def __init__(self, path=HISTORY_FILE, limit=100000):
+        self.path = path
+        self.entries = []
+        self.trigrams = collections.defaultdict(list)  # trigram -> ascending entry numbers
+        self.indexed = 0
+        try:
+            with open(path, encoding="utf-8") as fh:
+                lines = collections.deque(fh, maxlen=limit)
+        except (OSError, TypeError):
+            lines = ()  # no file yet, or path None for a session without history
+        for line in lines:
+            try:
+                self.entries.append(json.loads(line))
+            except ValueError:
+                continue
+
+    def _catch_up(self):
+        for n in range(self.indexed, len(self.entries)):
+            entry = self.entries[n]
+            for gram in {entry[i:i + 3] for i in range(len(entry) - 2)}:
+                self.trigrams[gram].append(n)
+        self.indexed = len(self.entries)
+
+    def add(self, entry):
+        if not entry or (self.entries and self.entries[-1] == entry):
+            return
+        self.entries.append(entry)
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry) + "\n")
+        except OSError:
+            pass  # history still works for this session
+
+    def search(self, query, before=None):
+        """Number of the newest entry before `before` that contains query, or None."""
+        before = len(self.entries) if before is None else before
+        self._catch_up()
+        if len(query) < 3:
+            candidates = range(before - 1, -1, -1)
+        else:
+            grams = [query[i:i + 3] for i in range(len(query) - 2)]
+            postings = min((self.trigrams.get(g, ()) for g in grams), key=len)
+            candidates = reversed(postings[:bisect.bisect_left(postings, before)])
+        return next((n for n in candidates if query in self.entries[n]), None)
+
+class PrefixTrie:
+    def __init__(self, words=()):
+        self.root = {}
+        for word in words:
+            self.insert(word)
+
+    def insert(self, word):
+        node = self.root
+        for c in word:
+            node = node.setdefault(c, {})
+        node[""] = word
+
+    def complete(self, prefix):
+        node = self.root
+        for c in prefix:
+            node = node.get(c)
+            if node is None:
+                return []
+        words, todo = [], [node]
+        while todo:
+            node = todo.pop()
+            for key, child in node.items():
+                if key == "":
+                    words.append(child)
+                else:
+                    todo.append(child)
+        return sorted(words)
+
+class Completer:
+    """Tab completion: command names from a trie, then paths from the filesystem."""
+    def __init__(self, fs):
+        self.fs = fs
+        self.trie = None
+        self.known = 0
+
+    def commands(self, prefix):
+        # Rebuilt only when plugins have added names since last time
+        if self.trie is None or self.known != len(commands.commands):
+            self.trie = PrefixTrie(commands.names())
+            self.known = len(commands.commands)
+        return self.trie.complete(prefix.lower())
+
+    def paths(self, prefix, limit=200):
+        if self.fs.has_magic(prefix):
+            return []
+        matches = []
+        # The glob bisects the directory's sorted name index to the prefix
+        for path in itertools.islice(self.fs.glob(prefix + "*"), limit):
+            node = self.fs.stat(path)
+            matches.append(path + "/" if node and node.is_dir else path)
+        return matches
+
+    def complete(self, line):
+        """Return (start offset of the last word, candidates) for the text before the cursor."""
+        words = tokenize(line) if line.strip() else []
+        word = "" if not words or line[-1:].isspace() else words[-1]
+        start = len(line) - len(word)
+        before = words[:-1] if word else words
+        if not before or before[-1] in SEPARATORS + ("|",) + KEYWORDS:
+            return start, self.commands(word)
+        return start, self.paths(word)
+
+def each(names, action, ok, fail):
+    """Apply action to every name, summarizing instead of one line per file.
+
+    An action may return a message string to report its own failure. The
+    exit status is 1 if any name failed.
+    """
+    done = 0
+    for name in names:
+        result = action(name)
+        if isinstance(result, str):
+            yield result
+        elif result:
+            done += 1
+        elif len(names) == 1:
+            yield fail
+    if len(names) == 1:
+        if done:
+            yield ok
+    else:
+        yield f"{ok} ({done}/{len(names)})"
+    return 0 if done == len(names) else 1
+
+def format_quota(d):
+    max_bytes, max_files = d.quota
+    text = f"{d.size}/{max_bytes}B ({d.size / max_bytes * 100 if max_bytes else 100:.1f}%)"
+    if max_files is not None:
+        text += f", {d.file_count}/{max_files} files"
+    return text
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+@commands.command("help", "help [command]", "Show this help", max_args=1)
+def cmd_help(sh, args):
+    return commands.help_lines(*args)
+
+@commands.command("ls", "ls [path] [--sort name|size|mtime] [-r] [--offset N] [--limit N] [-w]",
+                  "List directory, one page at a time (-w: keep reporting changes)")
+def cmd_ls(sh, args):
+    opts = {"sort": None, "offset": 0, "limit": None, "reverse": False}
+    paths = []
+    watch = False
+    args = [a for arg in args for a in arg.split("=", 1)]
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "-w":
+            watch = True
+        elif arg == "-r":
+            opts["reverse"] = True
+        elif arg in ("--sort", "--offset", "--limit") and i + 1 < len(args):
+            value = args[i + 1]
+            if arg == "--sort" and value not in ("name", "size", "mtime"):
+                yield "ls: --sort must be name, size or mtime"
+                return
+            opts[arg[2:]] = value if arg == "--sort" else int(value)
+            i += 1
+        else:
+            paths.append(arg)
+        i += 1
+    fs = sh.filesystem
+    status = 0
+    listed = []
+    for path in paths or ["."]:
+        node = fs.stat(path)
+        if node is None:
+            yield f"ls: {path}: No such file or directory"
+            status = 1
+        elif not node.is_dir:
+            yield f"[FILE] {path} ({node.size}B)"
+        else:
+            if len(paths) > 1:
+                yield f"{path}:"
+            for f in fs.list_dir(path, **opts):
+                yield f"{'[DIR]' if f.is_dir else '[FILE]'} {f.name} ({f.size}B)"
+            listed.append(path)
+    if watch:
+        for path in listed:
+            yield from watch_dir(sh, path)
+    return status
+
+def watch_dir(sh, path):
+    import posixpath
+    fs = sh.filesystem
+    path = posixpath.normpath(posixpath.join(fs.pwd(), path))
+    marks = {"create": "+", "modify": "~", "delete": "-"}
+
+    def on_events(events):
+        for event, changed in events:
+            node = fs.stat(changed) if event != "delete" else None
+            size = f" ({node.size}B)" if node else ""
+            sh.print_gui(f"[watch {path}] {marks[event]} {changed.rsplit('/', 1)[1]}{size}")
+
+    sh.shell_watches.append(fs.watch(path, on_events))
+    yield f"Watching {path} (unwatch to stop)"
+
+@commands.command("unwatch", help="Stop ls -w watches", max_args=0)
+def cmd_unwatch(sh, args):
+    for wid in sh.shell_watches:
+        sh.filesystem.unwatch(wid)
+    yield f"Stopped {len(sh.shell_watches)} watch(es)."
+    sh.shell_watches = []
+
+@commands.command("mkfile", "mkfile <name>...", "Create file", min_args=1)
+def cmd_mkfile(sh, args):
+    return each(args, sh.filesystem.create_file, "File created.", "Already exists.")
+
+@commands.command("write", "write <name> <content>", "Write to file", min_args=2)
+def cmd_write(sh, args):
+    result = sh.filesystem.write_file(args[0], " ".join(args[1:]))
+    yield "Written." if result else "Write failed."
+    return 0 if result else 1
+
+@commands.command("read", "read <name>...", "Read file", min_args=1)
+def cmd_read(sh, args):
+    status = 0
+    for name in args:
+        lines = sh.filesystem.read_lines(name)
+        if lines is None:
+            yield "File not found."
+            status = 1
+        else:
+            yield from lines
+    return status
+
+@commands.command("mkdir", "mkdir <name>...", "Create directory", min_args=1)
+def cmd_mkdir(sh, args):
+    return each(args, sh.filesystem.mkdir, "Directory created.", "Already exists.")
+
+@commands.command("cp", "cp [-r] <src>... <dst>", "Copy files or directories", min_args=2)
+def cmd_cp(sh, args):
+    recursive = "-r" in args
+    *sources, dst = [a for a in args if a != "-r"]
+
+    def copy(src):
+        node = sh.filesystem.stat(src)
+        if node and node.is_dir and not recursive:
+            return f"cp: -r not specified; omitting directory '{src}'"
+        return sh.filesystem.copy(src, dst)
+
+    if not sources:
+        yield "Usage: cp [-r] <src>... <dst>"
+        return
+    return (yield from each(sources, copy, "Copied.", "Copy failed."))
+
+@commands.command("mv", "mv <src>... <dst>", "Move or rename", min_args=2)
+def cmd_mv(sh, args):
+    *sources, dst = args
+    return each(sources, lambda src: sh.filesystem.move(src, dst), "Moved.", "Move failed.")
+
+@commands.command("rm", "rm [-r] <path>...", "Remove files or directories", min_args=1)
+def cmd_rm(sh, args):
+    recursive = "-r" in args
+
+    def remove(path):
+        node = sh.filesystem.stat(path)
+        if node and node.is_dir and sh.filesystem.list_dir(path, limit=1) and not recursive:
+            return f"rm: {path}: Directory not empty (use -r)"
+        # Unlinking the subtree is O(depth): the totals already know its size
+        return sh.filesystem.delete(path)
+
+    return each([a for a in args if a != "-r"], remove, "Removed.", "Not found.")
+
+@commands.command("delete", "delete <name>...", "Delete file/dir", min_args=1)
+def cmd_delete(sh, args):
+    return each(args, sh.filesystem.delete, "Deleted.", "Not found.")
+
+@commands.command("find", "find [path] [-name glob] [-size [+-]N[kMG]] [-type f|d]", "Search")
+def cmd_find(sh, args):
+    path = "."
+    if args and not args[0].startswith("-"):
+        path, args = args[0], args[1:]
+    opts = dict(zip(args[::2], args[1::2]))
+    size = opts.get("-size")
+    if size:
+        op = size[0] if size[0] in "+-" else "="
+        number = size.lstrip("+-")
+        units = {"k": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+        size = (op, int(number[:-1]) * units[number[-1]] if number[-1] in units else int(number))
+    matches = 0
+    for match, _ in sh.filesystem.find(path, opts.get("-name"), size, opts.get("-type")):
+        yield match
+        matches += 1
+    yield f"{matches} match(es)."
+
+@commands.command("cd", "cd [dir]", "Change directory", max_args=1)
+def cmd_cd(sh, args):
+    if not sh.filesystem.cd(args[0] if args else "/"):
+        yield f"cd: no such directory: {args[0]}"
+        return 1
+
+@commands.command("pwd", help="Show current directory", max_args=0)
+def cmd_pwd(sh, args):
+    yield sh.filesystem.pwd()
+
+@commands.command("mount", "mount [<host-path> <vfs-dir>]", "Mount a host directory (read-only) or list mounts",
+                  local=True)
+def cmd_mount(sh, args):
+    fs = sh.filesystem
+    if len(args) >= 2:
+        result = fs.mount(args[0], args[1])
+        yield f"Mounted {args[0]} on {args[1]}." if result else "Mount failed."
+    elif fs.mounts:
+        for path, host in fs.mounts.items():
+            yield f"{host} on {path}"
+    else:
+        yield "No mounts."
+
+@commands.command("umount", "umount <vfs-dir>", "Remove a mount", min_args=1, max_args=1, local=True)
+def cmd_umount(sh, args):
+    yield "Unmounted." if sh.filesystem.umount(args[0]) else "Not mounted."
+
+@commands.command("du", "du [path]", "Show disk usage", max_args=1)
+def cmd_du(sh, args):
+    path = args[0] if args else "."
+    node = sh.filesystem.stat(path)
+    if node is None:
+        yield f"du: {path}: No such file or directory"
+        return
+    if node.is_dir:
+        for f in sh.filesystem.list_dir(path):
+            if f.is_dir:
+                yield f"{f.size:>10}B  {f.file_count:>6} files  {f.name}/"
+    size, files, dirs = sh.filesystem.usage(path)
+    yield f"{size:>10}B  {files:>6} files  {dirs} dirs  {path}"
+    if node.is_dir and node.quota:
+        yield f"quota: {format_quota(node)}"
+
+@commands.command("tree", "tree [path] [depth]", "Show directory tree with sizes", max_args=2)
+def cmd_tree(sh, args):
+    path = args[0] if args else "."
+    depth = int(args[1]) if len(args) > 1 else 2
+    fs = sh.filesystem
+    node = fs.stat(path)
+    if node is None:
+        yield f"tree: {path}: No such file or directory"
+        return
+    todo = [(node, 0)]
+    while todo:
+        f, level = todo.pop()
+        label = f.name + ("/" if f.is_dir and f.name != "/" else "")
+        extra = f", {f.file_count} files" if f.is_dir else ""
+        yield f"{'  ' * level}{label} ({f.size}B{extra})"
+        if f.is_dir and level < depth:
+            with fs.lock.read():
+                children = list(f.children.values())
+            todo.extend((c, level + 1) for c in reversed(children))
+
+@commands.command("quota", "quota set <dir> <bytes> [files] | quota clear <dir> | quota [dir]",
+                  "Limit a directory, remove or show its quota", max_args=4)
+def cmd_quota(sh, args):
+    fs = sh.filesystem
+    if args[:1] == ["set"] and len(args) > 2:
+        max_files = int(args[3]) if len(args) > 3 else None
+        yield "Quota set." if fs.set_quota(args[1], int(args[2]), max_files) else "Not a directory."
+    elif args[:1] == ["clear"] and len(args) == 2:
+        yield "Quota cleared." if fs.set_quota(args[1], None) else "Not a directory."
+    elif len(args) <= 1 and args[:1] not in (["set"], ["clear"]):
+        path = args[0] if args else "."
+        node = fs.stat(path)
+        if node is None or not node.is_dir:
+            yield "Not a directory."
+        elif node.quota is None:
+            yield f"{path}: no quota"
+        else:
+            yield f"{path}: {format_quota(node)}"
+    else:
+        yield "Usage: " + commands.commands["quota"].usage
+
+@commands.command("mem", help="Show memory info", max_args=0)
+def cmd_mem(sh, args):
+    info = sh.memory.get_info()
+    yield f"Memory: {info['used']}/{info['total']} used | {info['free']} free"
+
+@commands.command("ps", help="List processes", max_args=0)
+def cmd_ps(sh, args):
+    procs = sh.process_manager.list()
+    if not procs:
+        yield "No running processes."
+    for p in procs:
+        addr_str = f"@0x{p.memory_start:04x}" if p.memory_start is not None else "@0x?????"
+        yield f"{p.pid}: {p.name} [{p.memory_size}B] {addr_str}"
+    for session in list(sh.sessions.values()):
+        yield "  " + session.stats()
+
+@commands.command("run", "run <name> <size>", "Start a process with the given memory size",
+                  min_args=2, max_args=2)
+def cmd_run(sh, args):
+    name, size = args[0], int(args[1])
+    proc = sh.process_manager.create(name, size, sh.owner)
+    addr = sh.memory.allocate(size, proc.pid)
+    if addr is None:
+        sh.process_manager.terminate(proc.pid)
+        yield f"Failed to start '{name}': Not enough memory"
+    else:
+        proc.memory_start = addr
+        yield f"Process '{name}' started (PID {proc.pid}) at 0x{addr:04x}"
+
+@commands.command("kill", "kill <pid>|%job", "Terminate a process or background job", min_args=1, max_args=1)
+def cmd_kill(sh, args):
+    if args[0].startswith("%"):
+        job = sh.jobs.find(args[0])
+    else:
+        job = next((j for j in sh.jobs.jobs.values() if str(j.proc.pid) == args[0]), None)
+    if job is not None and job.state == "Running":
+        sh.jobs.cancel(job)
+        yield f"[{job.id}] cancelling {job.line}"
+        return
+    if args[0].startswith("%"):
+        yield f"kill: no such job {args[0]}"
+        return
+    pid = int(args[0])
+    proc = sh.process_manager.get(pid)
+    if proc is not None and not sh.trusted and proc.owner != sh.owner:
+        # Like reset: a network client may not stop the host's or another session's work
+        yield f"kill: {pid}: not started by this session"
+        return 1
+    sh.memory.deallocate(pid)
+    yield f"Process {pid} terminated" if sh.process_manager.terminate(pid) else f"Process {pid} not found"
+
+@commands.command("jobs", help="List background jobs", max_args=0)
+def cmd_jobs(sh, args):
+    if not sh.jobs.jobs:
+        yield "No jobs."
+    for job in sorted(sh.jobs.jobs.values(), key=lambda j: j.id):
+        yield f"[{job.id}] {job.proc.pid}  {job.state:<8} {job.line}"
+        job.reported = job.state != "Running"
+    sh.jobs.forget_reported()
+
+@commands.command("fg", "fg [%job]", "Wait for a background job in the foreground", max_args=1)
+def cmd_fg(sh, args):
+    job = sh.jobs.find(*args)
+    if job is None:
+        yield "fg: no such job"
+        return
+    yield job.line
+    try:
+        sh.wait_for(job)
+    except JobCancelled:
+        sh.jobs.cancel(job)  # the job is in the foreground now, so Ctrl-C is meant for it
+        raise
+
+@commands.command("wait", "wait [%job...]", "Wait for background jobs to finish")
+def cmd_wait(sh, args):
+    jobs = [sh.jobs.find(a) for a in args] if args else list(sh.jobs.jobs.values())
+    for job in jobs:
+        if job is None:
+            yield "wait: no such job"
+        else:
+            sh.wait_for(job)
+
+@commands.command("python", "python <code>", "Execute Python code", raw=True, local=True)
+def cmd_python(sh, args):
+    try:
+        exec(" ".join(args), globals(), {"self": sh, "sh": sh})
+        yield "Code executed."
+    except Exception as e:
+        yield f"Error: {e}"
+
+@commands.command("time", "time [-m] <command line>",
+                  "Run a command line and report wall and CPU time (-m: also allocations)",
+                  min_args=1, raw=True)
+def cmd_time(sh, args):
+    line = args[0]
+    # tracemalloc slows Python code several times over, so it only runs with -m
+    # and the timings it produces are labelled as such
+    memory = line.split(None, 1)[0] == "-m"
+    if memory:
+        line = line.split(None, 1)[1] if len(line.split(None, 1)) > 1 else ""
+        if not line:
+            yield "Usage: " + commands.commands["time"].usage
+            return 1
+        import tracemalloc
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+    stream = run_line(sh, line)
+    status, lines, busy = 0, 0, 0.0
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        while True:
+            # Time spent inside the command, apart from printing what it yields
+            tick = time.perf_counter()
+            try:
+                out = next(stream)
+            except StopIteration as stop:
+                status = stop.value
+                busy += time.perf_counter() - tick
+                break
+            busy += time.perf_counter() - tick
+            lines += 1
+            yield out
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if memory:
+            after, peak = tracemalloc.get_traced_memory()
+    finally:
+        if memory and started:
+            tracemalloc.stop()
+    report = f"real {wall:.3f}s (command {busy:.3f}s, output {wall - busy:.3f}s)  cpu {cpu:.3f}s  {lines} lines"
+    if memory:
+        report += (f"  alloc {(after - before) / 1024:+.1f} KiB, peak {(peak - before) / 1024:.1f} KiB"
+                   "  (timed under tracemalloc)")
+    yield report
+    return status
+
+@commands.command("profile", "profile [-n N] [-s cumulative|tottime|calls] [-o file] <command line>",
+                  "Run a command line under cProfile and show the top functions", min_args=1, raw=True)
+def cmd_profile(sh, args):
+    import cProfile
+    import pstats
+    opts = {"-n": "20", "-s": "cumulative", "-o": None}
+    words = args[0].split(None, 1)
+    while len(words) == 2 and words[0] in opts:
+        # Options come first; the rest of the line is the command, untouched
+        value, *rest = words[1].split(None, 1)
+        opts[words[0]] = value
+        words = rest[0].split(None, 1) if rest else []
+    if not words:
+        yield "Usage: " + commands.commands["profile"].usage
+        return 1
+    if opts["-o"] and not sh.trusted:
+        yield "profile: -o is not available to network sessions"
+        return 1
+    profiler = cProfile.Profile()
+    stream = run_line(sh, words[0])
+    status = 0
+    while True:
+        # Only the command is profiled, not the frontend printing its output
+        profiler.enable()
+        try:
+            out = next(stream)
+        except StopIteration as stop:
+            status = stop.value
+            break
+        finally:
+            profiler.disable()
+        yield out
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report).strip_dirs().sort_stats(opts["-s"])
+    if opts["-o"]:
+        # The filesystem holds text, so the saved profile is the full pstats listing
+        stats.print_stats()
+        fs = sh.filesystem
+        if (fs.stat(opts["-o"]) or fs.create_file(opts["-o"])) and fs.write_file(opts["-o"], report.getvalue()):
+            yield f"Profile saved to {opts['-o']} ({stats.total_calls} calls, {stats.total_tt:.3f}s)."
+        else:
+            yield f"profile: cannot write {opts['-o']}"
+    else:
+        stats.print_stats(int(opts["-n"]))
+        yield from (line for line in report.getvalue().splitlines() if line.strip())
+    return status
+
+@commands.command("export", "export <dir> <host.tar>", "Stream a directory into a tar file",
+                  min_args=2, max_args=2, local=True)
+def cmd_export(sh, args):
+    return tar_transfer(sh, "export", *args)
+
+@commands.command("import", "import <host.tar> <dir>", "Stream a tar file into a directory",
+                  min_args=2, max_args=2, local=True)
+def cmd_import(sh, args):
+    return tar_transfer(sh, "import", *args)
+
+def tar_transfer(sh, action, src, dst):
+    import tarfile
+
+    def progress(files, total):
+        sh.print_gui(f"{action}: {files} files, {total}B...")
+        sh.update_ui()
+
+    try:
+        if action == "export":
+            result = sh.filesystem.export_tar(src, dst, progress)
+        else:
+            result = sh.filesystem.import_tar(src, dst, progress)
+    except (OSError, tarfile.TarError) as e:
+        yield f"{action} failed: {e}"
+        return 1
+    if result is None:
+        yield f"{action} failed: no such directory."
+        return 1
+    yield f"{action}: done, {result[0]} files, {result[1]}B."
+    return 0
+
+@commands.command("titles", "titles <url file> [-o out.tsv] [-j workers] [-t seconds]",
+                  "Fetch the page title of every URL in a file, concurrently, into a TSV file",
+                  min_args=1, max_args=7, local=True)
+def cmd_titles(sh, args):
+    import posixpath
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    opts = {"-o": None, "-j": "16", "-t": str(TITLE_TIMEOUT)}
+    rest = []
+    i = 0
+    while i < len(args):
+        if args[i] in opts and i + 1 < len(args):
+            opts[args[i]] = args[i + 1]
+            i += 1
+        else:
+            rest.append(args[i])
+        i += 1
+    if len(rest) != 1:
+        yield "Usage: " + commands.commands["titles"].usage
+        return 1
+    src = rest[0]
+    fs = sh.filesystem
+    lines = fs.read_lines(src)
+    if lines is None:
+        yield f"titles: {src}: no such file"
+        return 1
+    urls = [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+    if not urls:
+        yield f"titles: no URLs in {src}"
+        return 1
+    out = opts["-o"] or posixpath.splitext(src)[0] + ".tsv"
+    if out == src:
+        out = src + ".tsv"
+    workers = max(1, min(int(opts["-j"]), len(urls)))
+    timeout = float(opts["-t"])
+
+    def fetch(url):
+        start = time.perf_counter()
+        try:
+            title = fetch_title(url, timeout, cancel)
+            result = "ok", title or ""
+        except Exception as e:
+            result = "error", str(e) or type(e).__name__
+        return result + ((time.perf_counter() - start) * 1000,)
+
+    # Results keep the order of the input file. The wait wakes up regularly to
+    # notice kill; then, as when a pipeline is closed, queued fetches are
+    # dropped and running ones stop at their next chunk
+    results = [None] * len(urls)
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ohios-titles")
+    start = time.perf_counter()
+    try:
+        pending = {executor.submit(fetch, url): n for n, url in enumerate(urls)}
+        remaining, done = set(pending), 0
+        while remaining:
+            finished, remaining = wait(remaining, timeout=0.2, return_when=FIRST_COMPLETED)
+            if job_cancelled():
+                raise JobCancelled()
+            for future in finished:
+                results[pending[future]] = future.result()
+                done += 1
+                if done % 100 == 0 and done < len(urls):
+                    yield f"titles: {done}/{len(urls)}..."
+                    sh.update_ui()
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    elapsed = time.perf_counter() - start
+
+    clean = lambda text: " ".join(text.split())
+    rows = ["url\tstatus\tms\ttitle"] + [f"{clean(url)}\t{status}\t{ms:.0f}\t{clean(text)}"
+                                         for url, (status, text, ms) in zip(urls, results)]
+    if not ((fs.stat(out) or fs.create_file(out)) and fs.write_file(out, "\n".join(rows) + "\n")):
+        yield f"titles: cannot write {out}"
+        return 1
+    failed = sum(1 for status, _, _ in results if status != "ok")
+    latency = sorted(ms for _, _, ms in results)
+    yield (f"titles: {len(urls)} URLs in {elapsed:.2f}s ({len(urls) / elapsed:.1f}/s) with {workers} workers, "
+           f"{len(urls) - failed} ok, {failed} failed -> {out}")
+    yield ("latency ms: " + "  ".join(f"p{p} {percentile(latency, p):.0f}" for p in (50, 90, 99))
+           + f"  max {latency[-1]:.0f}")
+    return 1 if failed else 0
+
+@commands.command("snapshot", "snapshot create|restore|delete <name> | snapshot list | snapshot diff <a> [b]",
+                  "Manage and compare filesystem snapshots", max_args=3)
+def cmd_snapshot(sh, args):
+    fs = sh.filesystem
+    action = args[0] if args else "list"
+    if action in ("create", "restore", "delete") and not sh.trusted:
+        # Snapshots belong to the host, like reset; sessions can list and diff them
+        yield f"snapshot {action}: not available to network sessions"
+        return 1
+    if action == "create" and len(args) > 1:
+        fs.snapshot(args[1])
+        yield f"Snapshot '{args[1]}' created."
+    elif action == "restore" and len(args) > 1:
+        yield "Restored." if fs.restore(args[1]) else f"No snapshot '{args[1]}'."
+    elif action == "delete" and len(args) > 1:
+        yield "Deleted." if fs.drop_snapshot(args[1]) else f"No snapshot '{args[1]}'."
+    elif action == "diff" and len(args) > 1:
+        changes = 0
+        for change, path in fs.diff(args[1], args[2] if len(args) > 2 else None):
+            yield f"{change} {path}"
+            changes += 1
+        yield f"{changes} change(s)."
+    elif action == "list":
+        if not fs.snapshots:
+            yield "No snapshots."
+        for name, (root, _, created) in fs.snapshots.items():
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+            yield f"{name:<20} {stamp}  {root.size}B  {root.file_count} files"
+    else:
+        yield "Usage: " + commands.commands["snapshot"].usage
+
+@commands.command("reset", "reset [snapshot]", "Reset system (optionally to a snapshot)", max_args=1)
+def cmd_reset(sh, args):
+    sh.reset_system(*args)
+
+@commands.command("grep", "grep [-v] [-i] <pattern>", "Keep lines matching a regular expression",
+                  min_args=1, pipe=True, expand=False)
+def cmd_grep(sh, args, stdin):
+    flags = [a for a in args if a in ("-v", "-i")]
+    pattern = " ".join(a for a in args if a not in flags).strip("'\"")
+    search = re.compile(pattern, re.IGNORECASE if "-i" in flags else 0).search
+    invert = "-v" in flags
+    status = 1
+    for line in stdin:
+        if bool(search(line)) != invert:
+            status = 0
+            yield line
+    return status
+
+@commands.command("head", "head [n]", "First n lines (default 10)", max_args=1, pipe=True)
+def cmd_head(sh, args, stdin):
+    # Returning early leaves upstream stages unread
+    yield from itertools.islice(stdin, int(args[0]) if args else 10)
+
+@commands.command("tail", "tail [n]", "Last n lines (default 10)", max_args=1, pipe=True)
+def cmd_tail(sh, args, stdin):
+    yield from collections.deque(stdin, maxlen=int(args[0]) if args else 10)
+
+@commands.command("wc", help="Count lines, words and characters", max_args=0, pipe=True)
+def cmd_wc(sh, args, stdin):
+    lines = words = chars = 0
+    for line in stdin:
+        lines += 1
+        words += len(line.split())
+        chars += len(line) + 1
+    yield f"{lines} {words} {chars}"
+
+@commands.command("sort", "sort [-r]", "Sort lines", max_args=1, pipe=True)
+def cmd_sort(sh, args, stdin):
+    yield from sorted(stdin, reverse="-r" in args)
+
+@commands.command("uniq", help="Drop repeated adjacent lines", max_args=0, pipe=True)
+def cmd_uniq(sh, args, stdin):
+    for line, _ in itertools.groupby(stdin):
+        yield line
+
+@commands.command("echo", "echo <text>", "Print text", expand=False)
+def cmd_echo(sh, args):
+    yield " ".join(a.strip("'\"") for a in args)
+
+@commands.command("test", "test -e|-f|-d <path> | test -z|-n <text> | test <a> =|!= <b>",
+                  "Check a condition; sets the exit status for if, while, && and ||", max_args=3)
+def cmd_test(sh, args):
+    args = [a.strip("'\"") for a in args]
+    if len(args) == 2 and args[0] in ("-e", "-f", "-d"):
+        node = sh.filesystem.stat(args[1])
+        ok = node is not None and (args[0] == "-e" or node.is_dir == (args[0] == "-d"))
+    elif len(args) == 2 and args[0] in ("-z", "-n"):
+        ok = (args[1] == "") == (args[0] == "-z")
+    elif len(args) == 3 and args[1] in ("=", "!="):
+        ok = (args[0] == args[2]) == (args[1] == "=")
+    else:
+        ok = len(args) == 1 and args[0] != ""
+    return 0 if ok else 1
+    yield  # still a generator, so the status reaches the caller
+
+@commands.command("true", help="Do nothing, successfully", expand=False)
+def cmd_true(sh, args):
+    return 0
+    yield
+
+@commands.command("false", help="Do nothing, unsuccessfully", expand=False)
+def cmd_false(sh, args):
+    return 1
+    yield
+
+@commands.command("source", "source <script> [args...]", "Run a shell script in the current shell",
+                  min_args=1)
+def cmd_source(sh, args):
+    return run_script(sh, args, sh.variables)
+
+@commands.command("sh", "sh <script> [args...]", "Run a shell script with its own variables", min_args=1)
+def cmd_sh(sh, args):
+    return run_script(sh, args, {})
+
+def run_script(sh, args, env):
+    text = sh.filesystem.read_file(args[0])
+    if text is None:
+        yield f"{args[0]}: No such file"
+        return 1
+    env.update({str(i): arg for i, arg in enumerate(args)})
+    env["#"] = str(len(args) - 1)
+    env["@"] = " ".join(args[1:])
+    return (yield from run_node(sh, parse_script(text), env))
+
+@commands.command("history", "history [n | -s text]", "Show recent commands, or search them", max_args=2)
+def cmd_history(sh, args):
+    history = sh.history
+    if args[:1] == ["-s"] and len(args) == 2:
+        n = history.search(args[1].strip("'\""))
+        while n is not None:
+            yield f"{n + 1:>6}  {history.entries[n]}"
+            n = history.search(args[1].strip("'\""), n)
+        return
+    count = int(args[0]) if args else 20
+    for n in range(max(len(history.entries) - count, 0), len(history.entries)):
+        yield f"{n + 1:>6}  {history.entries[n]}"
+
+@commands.command("clear", help="Clear the output", max_args=0)
+def cmd_clear(sh, args):
+    sh.clear_output()
+
+# =========================
+# V2.1 KERNEL (headless)
+# =========================
+
+class Kernel:
+    """Memory, processes, filesystem and shell state, with no UI attached.
+
+    This is the `sh` every command handler gets. Output goes to `write`
+    (print by default); frontends override print_gui, wait_for and the UI
+    hooks. Scripts and tests can drive it directly:
+
+        k = Kernel(history_file=None)
+        lines, status = k.run("mkdir /etc && ls /")
+    """
+    trusted = True  # may run commands that reach the host; see Command.local
+    owner = None  # recorded on the processes this shell starts; see Process.owner
+    foreground = None  # the Foreground of the command execute is running
+    poll_input = None  # see Foreground
+
+    def __init__(self, memory_size=2048, history_file=HISTORY_FILE, write=print):
+        self.memory_size = memory_size
+        self.write = write
+        self.memory = Memory(memory_size)
+        self.process_manager = ProcessManager()
+        self.filesystem = FileSystem()
+        self.shell_watches = []
+        self.variables = {}
+        self.jobs = JobControl()
+        self.history = History(history_file)
+        self.sessions = {}  # pid -> Session, for network shells
+
+    def print_gui(self, text):
+        self.write(text)
+
+    def run(self, line):
+        """Run a command line; returns (output lines, exit status)."""
+        lines = []
+        stream = run_line(self, line)
+        try:
+            while True:
+                lines.append(next(stream))
+        except StopIteration as stop:
+            return lines, stop.value or 0
+        except ShellError as e:
+            return lines + [str(e)], 1
+
+    def execute(self, cmd):
+        """Run a command line, printing its output; a trailing & runs it as a job."""
+        stripped = cmd.rstrip()
+        if stripped.endswith("&") and not stripped.endswith("&&"):
+            job = self.jobs.submit(self, stripped[:-1].strip())
+            self.print_gui(f"[{job.id}] {job.proc.pid}")
+            return
+        outer, self.foreground = self.foreground, Foreground(self.poll_input)
+        token = CURRENT_JOB.set(self.foreground)
+        try:
+            stream = run_line(self, cmd)
+            for line in stream:
+                if self.foreground.cancelled:
+                    stream.close()
+                    raise JobCancelled()
+                self.print_gui(line)
+        except JobCancelled:
+            self.print_gui("Interrupted.")
+        except ShellError as e:
+            self.print_gui(str(e))
+        except Exception as e:
+            self.print_gui(f"Error: {e}")
+        finally:
+            CURRENT_JOB.reset(token)
+            self.foreground = outer
+
+    def interrupt(self):
+        """Stop the foreground command at its next line or loop pass (Ctrl-C)."""
+        if self.foreground is not None:
+            self.foreground.interrupted = True
+
+    def job_output(self, job, line):
+        if line is not None:
+            self.print_gui(f"[{job.id}] {line}")
+        else:
+            self.print_gui(f"[{job.id}]+ {job.state}  {job.line}")
+            job.reported = True
+
+    def drain_jobs(self):
+        """Print what background jobs have queued; returns the jobs that finished."""
+        done = []
+        for job, line in self.jobs.drain():
+            self.job_output(job, line)
+            if line is None:
+                done.append(job)
+        self.jobs.forget_reported()
+        return done
+
+    def wait_for(self, job):
+        # Block on the job queue itself, printing output as it arrives
+        while not job.reported:
+            try:
+                self.job_output(*self.jobs.output.get(timeout=0.2))
+            except queue.Empty:
+                if job_cancelled():
+                    raise JobCancelled()
+
+    def pump(self):
+        """Deliver watch events and job output; a frontend calls this between commands."""
+        self.filesystem.flush_events()
+        self.drain_jobs()
+
+    def reset_system(self, snapshot=None):
+        if snapshot is not None and snapshot not in self.filesystem.snapshots:
+            self.print_gui(f"No snapshot '{snapshot}'.")
+            return False
+        self.memory = Memory(self.memory_size)
+        self.process_manager = ProcessManager()
+        # Swapping the root keeps snapshots around, so rigs can reset in O(1)
+        self.filesystem.restore(snapshot)
+        self.filesystem.cwd_path = ()
+        self.print_gui("System Reset Complete" + (f" (snapshot '{snapshot}')" if snapshot else ""))
+        return True
+
+    def print_memory_info(self):
+        info = self.memory.get_info()
+        self.print_gui(f"[MEM] {info['used']}/{info['total']} used | {info['free']} free")
+
+    def update_ui(self):
+        """Called during long commands (tar progress) so a frontend can repaint."""
+
+    def clear_output(self):
+        pass
+
+class Shell:
+    """Terminal frontend for a Kernel: the REPL from the shell-only version."""
+    def __init__(self, kernel):
+        self.kernel = kernel
+        self.completer = Completer(kernel.filesystem)
+        self.readline = None
+        self.prefill = ""  # put on the next input line, for editing
+        self.search_state = None  # (query, entry number) of the last !? match
+
+    def setup_readline(self):
+        try:
+            import readline
+        except ImportError:
+            return
+        self.readline = readline
+        # Up/Down come from readline, seeded with recent history. Ctrl-R turns
+        # the line into a !? search, which History.search answers from its index
+        for entry in self.kernel.history.entries[-1000:]:
+            readline.add_history(entry.replace("\n", " "))
+        readline.set_completer_delims(" \t\n")
+        readline.set_completer(lambda text, state: self.complete(readline.get_line_buffer()
+                                                                 [:readline.get_endidx()], state))
+        readline.parse_and_bind("tab: complete")
+        readline.parse_and_bind(r'"\C-r": "\C-a!?\C-m"')
+        readline.set_pre_input_hook(self.pre_input)
+
+    def pre_input(self):
+        if self.prefill:
+            self.readline.insert_text(self.prefill)
+            self.readline.redisplay()
+            self.prefill = ""
+
+    def reverse_search(self, query):
+        """Handle !?query: the newest entry containing query becomes the next line.
+
+        Searching again from a line that is the last match (Ctrl-R twice)
+        goes on to the next older match of the same query.
+        """
+        history = self.kernel.history
+        before = None
+        if self.search_state and query == history.entries[self.search_state[1]].replace("\n", " "):
+            query, before = self.search_state
+        n = history.search(query, before)
+        if self.readline is not None:
+            # Keep the search itself out of Up/Down
+            self.readline.remove_history_item(self.readline.get_current_history_length() - 1)
+        if n is None:
+            print(f"(no match for '{query}')")
+            self.search_state = None
+            self.prefill = query
+            return
+        self.search_state = (query, n)
+        self.prefill = history.entries[n].replace("\n", " ")
+        if self.readline is None:
+            print(self.prefill)
+
+    def complete(self, line, state):
+        _, matches = self.completer.complete(line)
+        return matches[state] if state < len(matches) else None
+
+    def run(self):
+        import signal
+        print("=" * 50)
+        print("Welcome to ohiOS 2.1 (headless)")
+        print("Type 'help' for available commands, 'exit' to quit")
+        print("=" * 50)
+        self.setup_readline()
+        while True:
+            self.kernel.pump()
+            try:
+                command = input(f"ohiOS:{self.kernel.filesystem.pwd()}$ ").strip()
+            except KeyboardInterrupt:
+                print("\nUse 'exit' to quit ohiOS")
+                continue
+            except EOFError:
+                print("\nGoodbye!")
+                break
+            if not command:
+                continue
+            if command == "exit":
+                print("Goodbye!")
+                break
+            if command.startswith("!?"):
+                self.reverse_search(command[2:])
+                continue
+            self.kernel.history.add(command)
+            # Ctrl-C stops the command between steps rather than in the middle of one
+            previous = signal.signal(signal.SIGINT, lambda signum, frame: self.kernel.interrupt())
+            try:
+                self.kernel.execute(command)
+            finally:
+                signal.signal(signal.SIGINT, previous)
 
 # =========================
-# V1 COMPONENTS: Memory, Process, FileSystem
+# Network Shell Server
 # =========================
 
-# Memory Management (from v1)
-class Memory:
-    def __init__(self, size):
-        self.size = size
-        self.used = 0
-        self.allocations = {}
+SESSION_HIGH_WATER = 64 * 1024  # bytes queued for a client before its command waits
+SESSION_QUEUE = 1024  # output lines a command may run ahead of the event loop
+SESSION_TYPEAHEAD = 64  # input lines read ahead while a command runs
+# Telnet commands and option negotiation (IAC IAC, a literal 0xff, is kept)
+TELNET_COMMAND = re.compile(rb"\xff(?:[\xfb-\xfe].|[\xf0-\xfa])", re.S)
 
-    def allocate(self, size, pid):
-        if self.used + size <= self.size:
-            addr = self.used
-            self.allocations[pid] = (addr, size)
-            self.used += size
-            return addr
-        return None
+class Session(Kernel):
+    """One network client: its own cwd, variables and jobs over a shared kernel.
 
-    def deallocate(self, pid):
-        if pid in self.allocations:
-            _, size = self.allocations.pop(pid)
-            self.used -= size
-            return True
-        return False
+    Each command runs on a thread of its own, inside the session's context,
+    so a blocking one (a long script, a big sort) holds up only its own
+    session. Output comes back to the event loop through a bounded queue;
+    past the transport's high-water mark the loop waits for the client
+    before draining more, the queue fills and the command waits in turn,
+    so a slow reader only stalls its own command. Input is read all the
+    while, so Ctrl-C (or telnet's Interrupt Process) stops the command.
+    Clients are not authenticated, so commands marked local (python, mount,
+    tar import/export, titles) are refused, and so are reset, snapshot
+    changes and killing processes the session did not start.
+    """
+    trusted = False
 
-    def get_info(self):
-        return {"total": self.size, "used": self.used, "free": self.size - self.used}
+    def __init__(self, kernel, reader, writer):
+        self.kernel = kernel
+        self.reader = reader
+        self.writer = writer
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.thread = threading.get_ident()
+        peer = writer.get_extra_info("peername")
+        self.peer = f"{peer[0]}:{peer[1]}" if isinstance(peer, tuple) else "unix"
+        self.variables = {}
+        self.shell_watches = []
+        self.jobs = JobControl(workers=1)
+        self.history = History(None)
+        self.proc = kernel.process_manager.create(f"session {self.peer}", 0)
+        self.owner = self.proc.pid
+        self.started = time.time()
+        self.last_active = self.started
+        self.commands = self.lines = self.bytes = self.stalls = 0
+        # The cwd lives in this context; every command of the session runs in it
+        self.context = contextvars.copy_context()
+        self.cwd = ()  # copies for ps and the prompt, updated after each command
+        self.prompt = "/"
+        self.output = queue.Queue(maxsize=SESSION_QUEUE)
+        self.input = asyncio.Queue(maxsize=SESSION_TYPEAHEAD)
+        self.wake = asyncio.Event()
+        self.woken = False
+        self.running = False
+        self.closed = False
 
-# Process (from v1)
-class Process:
-    def __init__(self, pid, name, memory_size):
-        self.pid = pid
-        self.name = name
-        self.memory_size = memory_size
-        self.memory_start = None
-        self.state = "Running"
+    # Shared with every other session
+    memory = property(lambda self: self.kernel.memory)
+    process_manager = property(lambda self: self.kernel.process_manager)
+    filesystem = property(lambda self: self.kernel.filesystem)
+    sessions = property(lambda self: self.kernel.sessions)
 
-class ProcessManager:
-    def __init__(self):
-        self.processes = {}
-        self.next_pid = 1000
+    def print_gui(self, text):
+        if self.closed:
+            raise JobCancelled()  # stops a command whose client went away
+        if threading.get_ident() != self.thread:
+            if self.running:
+                self.send(text)  # keeps its place among the command's output
+            else:
+                self.loop.call_soon_threadsafe(self.print_gui, text)
+            return
+        data = (text + "\n").encode("utf-8", "replace")
+        self.lines += 1
+        self.bytes += len(data)
+        self.writer.write(data)
 
-    def create(self, name, memory_size):
-        pid = self.next_pid
-        self.next_pid += 1
-        proc = Process(pid, name, memory_size)
-        self.processes[pid] = proc
-        return proc
+    def wait_for(self, job):
+        # Blocking would stall every session on the loop; output arrives anyway
+        if not job.reported:
+            self.print_gui(f"[{job.id}] still running; its output will follow")
 
-    def terminate(self, pid):
-        return self.processes.pop(pid, None)
+    def reset_system(self, snapshot=None):
+        self.print_gui("reset: not available from a network session")
+        return False
 
-    def list(self):
-        return list(self.processes.values())
+    def stats(self):
+        idle = time.time() - self.last_active
+        return (f"session {self.proc.pid} {self.peer}  cwd /{'/'.join(self.cwd)}  cmds {self.commands}  "
+                f"out {self.lines} lines/{self.bytes / 1024:.1f} KiB  stalls {self.stalls}  "
+                f"idle {idle:.0f}s  up {time.time() - self.started:.0f}s")
 
-    def get(self, pid):
-        return self.processes.get(pid)
+    def send(self, text):
+        """Queue a line from the command thread; None marks the end of the command."""
+        while not self.closed:
+            try:
+                self.output.put(text, timeout=0.2)
+            except queue.Full:
+                continue
+            if not self.woken:
+                self.woken = True
+                self.loop.call_soon_threadsafe(self.wake.set)
+            return
+        raise JobCancelled()
 
-# File System (from v1)
-class File:
-    def __init__(self, name, is_dir=False):
-        self.name = name
-        self.is_dir = is_dir
-        self.content = "" if not is_dir else None
-        self.size = 0
-        self.children = {} if is_dir else None
+    def run_thread(self, line):
+        try:
+            self.execute(line)
+            self.cwd = self.filesystem.cwd_path
+            self.prompt = self.filesystem.pwd()
+        except JobCancelled:
+            pass
+        finally:
+            with contextlib.suppress(JobCancelled):
+                self.send(None)
 
-class FileSystem:
-    def __init__(self):
-        self.root = File("/", True)
-        self.cwd = self.root
+    async def run_command(self, line):
+        self.commands += 1
+        self.running = True
+        thread = threading.Thread(target=self.context.run, args=(self.run_thread, line), daemon=True,
+                                  name=f"ohios-session-{self.proc.pid}")
+        thread.start()
+        try:
+            while True:
+                await self.wake.wait()
+                # Reset before draining: a line queued after this wakes us again
+                self.wake.clear()
+                self.woken = False
+                while True:
+                    try:
+                        text = self.output.get_nowait()
+                    except queue.Empty:
+                        break
+                    if text is None:
+                        thread.join()  # all that is left is leaving the context
+                        return
+                    if self.writer.transport.is_closing():
+                        raise ConnectionResetError("client went away")
+                    self.print_gui(text)
+                    if self.writer.transport.get_write_buffer_size() > SESSION_HIGH_WATER:
+                        self.stalls += 1
+                        await self.writer.drain()
+        except BaseException:
+            self.closed = True  # the client is gone (or the server stopping): end the command
+            raise
+        finally:
+            self.running = False
 
-    def list_dir(self):
-        return list(self.cwd.children.values())
+    async def read_input(self):
+        """Queue the client's lines for serve; an interrupt acts at once."""
+        buffer = b""
+        try:
+            while True:
+                data = await self.reader.read(4096)
+                if not data:
+                    break
+                if b"\x03" in data or b"\xff\xf4" in data:
+                    self.interrupt()
+                buffer += TELNET_COMMAND.sub(b"", data).replace(b"\x03", b"")
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    await self.input.put(line.decode("utf-8", "replace").strip())
+                if len(buffer) > SESSION_HIGH_WATER:
+                    break  # no end of line in sight
+        except ConnectionError:
+            pass
+        await self.input.put(None)
 
-    def create_file(self, name):
-        if name in self.cwd.children:
-            return False
-        self.cwd.children[name] = File(name)
-        return True
+    async def serve(self):
+        import asyncio
+        reading = asyncio.ensure_future(self.read_input())
+        try:
+            self.print_gui("Welcome to ohiOS 2.1 (network shell). Type 'help', or 'exit' to leave.")
+            while True:
+                self.writer.write(f"ohiOS:{self.prompt}$ ".encode())
+                await self.writer.drain()
+                line = await self.input.get()
+                if line is None:
+                    break
+                self.last_active = time.time()
+                if line in ("exit", "logout"):
+                    break
+                if line:
+                    await self.run_command(line)
+        finally:
+            reading.cancel()
 
-    def write_file(self, name, content):
-        f = self.cwd.children.get(name)
-        if f and not f.is_dir:
-            f.content = content
-            f.size = len(content)
-            return True
-        return False
+    def close(self):
+        self.closed = True
+        for wid in self.shell_watches:
+            self.filesystem.unwatch(wid)
+        self.process_manager.terminate(self.proc.pid)
+        self.writer.close()
 
-    def read_file(self, name):
-        f = self.cwd.children.get(name)
-        if f and not f.is_dir:
-            return f.content
-        return None
+async def handle_session(kernel, reader, writer):
+    session = Session(kernel, reader, writer)
+    kernel.sessions[session.proc.pid] = session
+    try:
+        await session.serve()
+    except ConnectionError:
+        pass
+    finally:
+        del kernel.sessions[session.proc.pid]
+        session.close()
 
-    def delete(self, name):
-        if name in self.cwd.children:
-            del self.cwd.children[name]
-            return True
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    import ipaddress
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
         return False
 
-    def mkdir(self, name):
-        if name in self.cwd.children:
-            return False
-        self.cwd.children[name] = File(name, True)
-        return True
+async def serve(kernel, host="127.0.0.1", port=7023, unix_path=None):
+    """Serve shell sessions on TCP (and a Unix socket) from one event loop."""
+    import asyncio
+    handler = functools.partial(handle_session, kernel)
+    servers = [await asyncio.start_server(handler, host, port)]
+    print(f"ohiOS shell server on {host}:{port}")
+    if unix_path:
+        servers.append(await asyncio.start_unix_server(handler, unix_path))
+        print(f"ohiOS shell server on {unix_path}")
 
-# HTML Title Parser (from v1)
-class TitleParser(HTMLParser):
-    def __init__(self):
-        super().__init__()
-        self.in_title = False
-        self.title = None
+    async def pump():
+        # Watch events and finished jobs for every session, ten times a second
+        while True:
+            await asyncio.sleep(0.1)
+            kernel.filesystem.flush_events()
+            for session in list(kernel.sessions.values()):
+                session.drain_jobs()
 
-    def handle_starttag(self, tag, attrs):
-        if tag.lower() == "title":
-            self.in_title = True
+    pumping = asyncio.ensure_future(pump())
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        pumping.cancel()
 
-    def handle_data(self, data):
-        if self.in_title:
-            self.title = data.strip()
+# =========================
+# Stress Check
+# =========================
 
-    def handle_endtag(self, tag):
-        if tag.lower() == "title":
-            self.in_title = False
+def check_invariants(kernel):
+    """Recompute what the kernel keeps incrementally; returns a list of problems."""
+    problems = []
+    fs = kernel.filesystem
+    with fs.lock.read():
+        dirs = [("/", fs.root)]
+        for path, d in dirs:  # grows while iterating: every directory, parents first
+            for c in d.children.values():
+                if c.is_dir and not isinstance(c, HostDir):
+                    dirs.append((path.rstrip("/") + "/" + c.name, c))
+        for path, d in reversed(dirs):
+            size = files = count = 0
+            for name, c in d.children.items():
+                if c.name != name:
+                    problems.append(f"{path}: entry {name!r} holds {c.name!r}")
+                if isinstance(c, HostDir):
+                    count += 1
+                elif c.is_dir:
+                    size, files, count = size + c.size, files + c.file_count, count + c.dir_count + 1
+                else:
+                    if c.size != len(c.content):
+                        problems.append(f"{path}/{name}: size {c.size}, content {len(c.content)}")
+                    size, files = size + c.size, files + 1
+            if (d.size, d.file_count, d.dir_count) != (size, files, count):
+                problems.append(f"{path}: totals {(d.size, d.file_count, d.dir_count)}, "
+                                f"recomputed {(size, files, count)}")
+            for key, index in d.order.items():
+                if index != sorted(File.sort_key(key, c) for c in d.children.values()):
+                    problems.append(f"{path}: {key} index out of date")
+    memory = kernel.memory
+    with memory._lock:
+        used = sum(size for _, size in memory.allocations.values())
+        if used != memory.used or not 0 <= used <= memory.size:
+            problems.append(f"memory: used {memory.used}, allocations hold {used}")
+    pm = kernel.process_manager
+    with pm._lock:
+        for pid, proc in pm.processes.items():
+            if proc.pid != pid or pid >= pm.next_pid:
+                problems.append(f"process table: {pid} holds pid {proc.pid}")
+    return problems
+
+def stress_test(threads=8, seconds=3.0, write=print):
+    """Hammer one kernel from many threads, checking invariants as it goes.
+
+    Workers mix shell commands with direct filesystem, memory and process
+    calls on shared paths, while a checker thread verifies the tree under
+    the read lock. Returns True if no worker failed and nothing was broken.
+    """
+    kernel = Kernel(history_file=None, write=lambda text: None)
+    fs, memory, pm = kernel.filesystem, kernel.memory, kernel.process_manager
+    fs.mkdir("/shared")
+    for t in range(threads):
+        fs.mkdir(f"/w{t}")
+    events = [0]
+    fs.watch("/", lambda batch: events.__setitem__(0, events[0] + len(batch)), recursive=True)
+    errors, problems, ops = [], [], [0] * threads
+    deadline = time.monotonic() + seconds
+
+    def worker(t):
+        rng = random.Random(t)
+        try:
+            while time.monotonic() < deadline:
+                op = rng.randrange(10)
+                a, b = f"/shared/f{rng.randrange(40)}", f"/shared/f{rng.randrange(40)}"
+                if op == 0:
+                    own = f"/w{t}/f{rng.randrange(20)}"
+                    kernel.run(f"mkfile {own} ; write {own} {'x' * rng.randrange(1, 80)} && cp {own} /shared")
+                elif op == 1:
+                    fs.create_file(a)
+                    fs.write_file(a, "y" * rng.randrange(200))
+                elif op == 2:
+                    fs.append_file(a, "z")
+                elif op == 3:
+                    fs.delete(a)
+                elif op == 4:
+                    fs.move(a, b) if rng.random() < 0.5 else fs.copy(a, b)
+                elif op == 5:
+                    d = f"/shared/d{rng.randrange(6)}"
+                    fs.makedirs(f"{d}/e{rng.randrange(4)}") if rng.random() < 0.7 else fs.delete(d)
+                elif op == 6:
+                    sum(1 for _ in fs.find("/"))
+                    list(fs.glob("/shared/*"))
+                    fs.list_dir("/shared", sort=rng.choice(("name", "size", "mtime")), limit=10)
+                    fs.usage("/")
+                elif op == 7:
+                    proc = pm.create(f"stress{t}", rng.randrange(1, 64))
+                    memory.allocate(proc.memory_size, proc.pid)
+                    memory.fragmentation()
+                    memory.deallocate(proc.pid)
+                    pm.terminate(proc.pid)
+                elif op == 8:
+                    fs.snapshot(f"s{t}")
+                    sum(1 for _ in fs.diff(f"s{t}"))
+                else:
+                    kernel.run("ls /shared --sort size --limit 5 | wc ; du /shared ; tree /shared 1 | wc")
+                ops[t] += 1
+        except Exception as e:
+            errors.append(f"thread {t}: {type(e).__name__}: {e}")
+
+    def checker():
+        while time.monotonic() < deadline and not problems:
+            fs.flush_events()
+            problems.extend(check_invariants(kernel))
+            time.sleep(0.05)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    workers.append(threading.Thread(target=checker))
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    fs.flush_events()
+    problems.extend(check_invariants(kernel))
+    write(f"{sum(ops)} operations on {threads} threads in {elapsed:.2f}s "
+          f"({sum(ops) / elapsed:,.0f}/s), {events[0]} watch events")
+    for line in errors + problems:
+        write(line)
+    write("stress: ok" if not errors and not problems else "stress: FAILED")
+    return not errors and not problems
 
 # =========================
 # V2 COMPONENTS: Window Manager
@@ -148,20 +3258,422 @@ class WindowManager:
         win.geometry(f"{width}x{height}")
         return win
 
+SCROLLBACK = int(os.environ.get("OHIOS_SCROLLBACK", "5000"))
+
+class OutputSink:
+    """Buffers lines for a Text widget and writes them in one insert per frame.
+
+    write() and clear() may be called from any thread: they only touch a
+    deque and a flag. The Tk thread flushes every `interval` ms and trims
+    the widget to the last `scrollback` lines; the deque keeps no more than
+    that either, so memory stays flat however much is printed.
+    """
+    def __init__(self, root, text, scrollback=SCROLLBACK, interval=16):
+        self.root = root
+        self.text = text
+        self.scrollback = scrollback
+        self.interval = interval
+        self.pending = collections.deque(maxlen=scrollback)
+        self.cleared = False
+        self.root.after(interval, self.tick)
+
+    def write(self, line):
+        self.pending.append(line)
+
+    def tick(self):
+        self.flush()
+        self.root.after(self.interval, self.tick)
+
+    def flush(self):
+        if self.cleared:
+            self.cleared = False
+            self.text.delete("1.0", "end")
+        if not self.pending:
+            return
+        lines = []
+        try:
+            while True:
+                lines.append(self.pending.popleft())
+        except IndexError:
+            pass
+        # Lines that would be trimmed right away are never inserted
+        text = "\n".join(lines[-self.scrollback:]) + "\n"
+        self.text.insert("end", text)
+        excess = int(self.text.index("end-1c").split(".")[0]) - 1 - self.scrollback
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
+        self.text.see("end")
+
+    def clear(self):
+        # The widget is emptied by the next flush, before anything written since
+        self.pending.clear()
+        self.cleared = True
+
+class VirtualTable:
+    """A ttk.Treeview that only holds the rows on screen.
+
+    The source provides count(), rows(offset, limit) -> [(key, values)],
+    sort(column, reverse) (False if it cannot sort by that column),
+    filter(text) and refresh(). Scrolling moves an offset into the source
+    and rewrites the visible items, so 100k rows cost the same as 20.
+    """
+    def __init__(self, parent, source, columns):
+        self.source = source
+        self.offset = 0
+        self.visible = 20
+        self.sorted_by = None  # (column, reverse)
+        self.selected = None
+        self.keys = {}  # item id -> source key of the row it shows
+        self.headings = {col: heading for col, heading, _ in columns}
+
+        frame = tk.Frame(parent)
+        frame.pack(fill="both", expand=True, padx=10, pady=5)
+        bar = tk.Frame(frame)
+        bar.pack(fill="x")
+        tk.Label(bar, text="Filter:").pack(side="left")
+        self.filter_text = tk.StringVar()
+        self.filter_text.trace_add("write", lambda *_: self.set_filter())
+        tk.Entry(bar, textvariable=self.filter_text).pack(side="left", fill="x", expand=True)
+
+        self.tree = ttk.Treeview(frame, columns=list(self.headings), show="headings", selectmode="browse")
+        for col, heading, width in columns:
+            self.tree.heading(col, text=heading, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=width, anchor="w")
+        self.scrollbar = tk.Scrollbar(frame, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.render()
+
+    def render(self):
+        total = self.source.count()
+        self.offset = max(0, min(self.offset, total - self.visible))
+        rows = self.source.rows(self.offset, self.visible)
+        items = self.tree.get_children()
+        self.keys = {}
+        for i, (key, values) in enumerate(rows):
+            item = items[i] if i < len(items) else self.tree.insert("", "end")
+            self.tree.item(item, values=values)
+            self.keys[item] = key
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+        shown = [item for item, key in self.keys.items() if key == self.selected]
+        self.tree.selection_set(shown)
+        if total:
+            self.scrollbar.set(self.offset / total, min(self.offset + self.visible, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def on_resize(self, event):
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, event.height // rowheight - 1)  # less the heading
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self.keys:
+            self.selected = self.keys[selection[0]]
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * self.source.count())
+        else:
+            self.offset += int(amount) * (self.visible if unit == "pages" else 1)
+        self.render()
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.render()
+
+    def sort_by(self, column):
+        reverse = self.sorted_by == (column, False)
+        if not self.source.sort(column, reverse):
+            return
+        self.sorted_by = (column, reverse)
+        for col, heading in self.headings.items():
+            arrow = (" \u25bc" if reverse else " \u25b2") if col == column else ""
+            self.tree.heading(col, text=heading + arrow)
+        self.offset = 0
+        self.render()
+
+    def set_filter(self):
+        self.source.filter(self.filter_text.get())
+        self.offset = 0
+        self.render()
+
+    def refresh(self):
+        self.source.refresh()
+        self.render()
+
+class Sparkline:
+    """A line over the last `length` samples, drawn as one Canvas item.
+
+    Each sample moves the existing line with coords(); a series that has
+    not changed for a full window is already drawn and is skipped.
+    """
+    def __init__(self, parent, length=60, width=180, height=28, color="lime"):
+        self.samples = collections.deque(maxlen=length)
+        self.unchanged = 0
+        self.width = width
+        self.height = height
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg="#111", highlightthickness=0)
+        self.line = self.canvas.create_line(0, height, 0, height, fill=color)
+
+    def add(self, value):
+        self.unchanged = self.unchanged + 1 if self.samples and value == self.samples[-1] else 0
+        self.samples.append(value)
+        if self.unchanged >= self.samples.maxlen:
+            return
+        low, high = min(self.samples), max(self.samples)
+        span = (high - low) or 1
+        step = self.width / max(self.samples.maxlen - 1, 1)
+        x0 = self.width - step * (len(self.samples) - 1)
+        points = []
+        for i, v in enumerate(self.samples):
+            points += [x0 + i * step, self.height - 2 - (v - low) / span * (self.height - 4)]
+        if len(points) == 2:
+            points += points
+        self.canvas.coords(self.line, *points)
+
+class MemoryMap:
+    """The Memory address space as rows of colored regions on a Canvas.
+
+    refresh() diffs the allocations against what is drawn and only creates
+    or deletes the items of regions that changed. Regions that overlap
+    another one are hatched with a red outline: the bump allocator hands out
+    `used` as the next address, which can land inside a live block after a
+    free below the top.
+    """
+    COLORS = ("#4e79a7", "#f28e2b", "#59a14f", "#b07aa1", "#76b7b2", "#edc948", "#9c755f", "#ff9da7")
+
+    def __init__(self, parent, get_memory, names, width=560, row_bytes=256, row_height=18):
+        self.get_memory = get_memory  # the kernel swaps Memory on reset
+        self.names = names
+        self.row_bytes = row_bytes
+        self.row_height = row_height
+        self.scale = width / row_bytes
+        self.memory = None
+        self.canvas = tk.Canvas(parent, width=width, height=row_height, bg="#111", highlightthickness=0)
+        self.canvas.bind("<Motion>", self.on_motion)
+        self.canvas.bind("<Leave>", lambda e: self.show_tip(None))
+
+    def rects(self, addr, size):
+        end = min(addr + size, self.memory.size)
+        while addr < end:
+            row, col = divmod(addr, self.row_bytes)
+            span = min(end - addr, self.row_bytes - col)
+            y = row * (self.row_height + 2)
+            yield col * self.scale, y, (col + span) * self.scale, y + self.row_height
+            addr += span
+
+    def reset(self, memory):
+        self.memory = memory
+        self.version = None
+        self.drawn = {}  # pid -> (addr, size, [canvas items])
+        self.overlapping = set()
+        self.canvas.delete("all")
+        rows = -(-memory.size // self.row_bytes)
+        self.canvas.config(height=rows * (self.row_height + 2))
+        # Free space is the row background showing through
+        for rect in self.rects(0, memory.size):
+            self.canvas.create_rectangle(*rect, fill="#444", outline="")
+        self.tip_bg = self.canvas.create_rectangle(0, 0, 0, 0, fill="black", outline="white", state="hidden")
+        self.tip = self.canvas.create_text(0, 0, anchor="nw", fill="white", state="hidden", font=("Courier", 9))
+
+    def refresh(self):
+        """Bring the drawing up to date; returns False if nothing changed."""
+        if self.get_memory() is not self.memory:
+            self.reset(self.get_memory())
+        if self.memory.version == self.version:
+            return False
+        self.version = self.memory.version
+        current = self.memory.snapshot()
+        for pid in [pid for pid, drawn in self.drawn.items() if current.get(pid) != drawn[:2]]:
+            self.canvas.delete(*self.drawn.pop(pid)[2])
+        fresh = set()
+        for pid, (addr, size) in current.items():
+            if pid not in self.drawn:
+                color = self.COLORS[pid % len(self.COLORS)]
+                items = [self.canvas.create_rectangle(*rect, fill=color, outline="", tags=f"pid{pid}")
+                         for rect in self.rects(addr, size)]
+                self.drawn[pid] = (addr, size, items)
+                fresh.add(pid)
+        overlapping = self.find_overlaps(current)
+        for pid in (overlapping ^ self.overlapping) | (fresh & overlapping):
+            hot = pid in overlapping
+            for item in self.drawn.get(pid, (0, 0, ()))[2]:
+                self.canvas.itemconfig(item, outline="red" if hot else "", width=2 if hot else 1,
+                                       stipple="gray50" if hot else "")
+        self.overlapping = overlapping
+        self.canvas.tag_raise(self.tip_bg)
+        self.canvas.tag_raise(self.tip)
+        return True
+
+    def find_overlaps(self, allocations):
+        # Sweep in address order: a block overlaps something iff it starts
+        # before the furthest end seen so far, and that block is the owner
+        overlapping, reach, owner = set(), 0, None
+        for addr, size, pid in sorted((a, s, p) for p, (a, s) in allocations.items() if s):
+            if addr < reach:
+                overlapping.update((pid, owner))
+            if addr + size > reach:
+                reach, owner = addr + size, pid
+        return overlapping
+
+    def on_motion(self, event):
+        row = int(event.y // (self.row_height + 2))
+        address = row * self.row_bytes + int(event.x / self.scale)
+        if self.memory is None or address >= self.memory.size:
+            self.show_tip(None)
+            return
+        # Ask the canvas which regions are under the pointer rather than scanning them all
+        under = self.canvas.find_overlapping(event.x, event.y, event.x, event.y)
+        pids = sorted({int(tag[3:]) for item in under for tag in self.canvas.gettags(item) if tag.startswith("pid")})
+        lines = [f"0x{address:04x}: " + ("free" if not pids else "OVERLAP" if len(pids) > 1 else "")]
+        for pid in pids:
+            addr, size, _ = self.drawn[pid]
+            lines.append(f"PID {pid} {self.names(pid)}  0x{addr:04x}-0x{addr + size - 1:04x} ({size}B)")
+        self.show_tip("\n".join(lines), event.x, event.y)
+
+    def show_tip(self, text, x=0, y=0):
+        if text is None:
+            self.canvas.itemconfig(self.tip, state="hidden")
+            self.canvas.itemconfig(self.tip_bg, state="hidden")
+            return
+        self.canvas.itemconfig(self.tip, text=text, state="normal")
+        x1, y1, x2, y2 = self.canvas.bbox(self.tip)
+        width, height = x2 - x1, y2 - y1
+        # Keep the tip inside the canvas
+        x = min(x + 12, int(self.canvas.cget("width")) - width - 4)
+        y = y + 12 if y + 12 + height < int(self.canvas.cget("height")) else max(y - height - 4, 0)
+        self.canvas.coords(self.tip, x, y)
+        self.canvas.coords(self.tip_bg, x - 3, y - 2, x + width + 3, y + height + 2)
+        self.canvas.itemconfig(self.tip_bg, state="normal")
+
+class ListSource:
+    """Table rows from a callable returning [(key, values)]; sorted and filtered as a list."""
+    def __init__(self, columns, fetch):
+        self.columns = columns
+        self.fetch = fetch
+        self.sorted_by = None
+        self.text = ""
+        self.refresh()
+
+    def refresh(self):
+        rows = self.fetch()
+        if self.text:
+            rows = [r for r in rows if any(self.text in str(v).lower() for v in r[1])]
+        if self.sorted_by:
+            i = self.columns.index(self.sorted_by[0])
+            # Numbers before text, so empty cells do not break the comparison
+            rows.sort(key=lambda r: (0, r[1][i], "") if isinstance(r[1][i], (int, float)) else (1, 0, str(r[1][i])),
+                      reverse=self.sorted_by[1])
+        self.view = rows
+
+    def count(self):
+        return len(self.view)
+
+    def rows(self, offset, limit):
+        return self.view[offset:offset + limit]
+
+    def sort(self, column, reverse):
+        self.sorted_by = (column, reverse)
+        self.refresh()
+        return True
+
+    def filter(self, text):
+        self.text = text.strip().lower()
+        self.refresh()
+
+class DirectorySource:
+    """Rows of one directory, paged straight from its sorted child indexes.
+
+    Only name, size and modified can be sorted, since those are the keys
+    File keeps indexes for. A filter is a glob (substring if it has no
+    wildcards) and is matched once per change, not per scroll.
+    """
+    SORT_KEYS = {"name": "name", "size": "size", "modified": "mtime"}
+
+    def __init__(self, fs, path):
+        self.fs = fs
+        self.path = path
+        self.key = "name"
+        self.reverse = False
+        self.pattern = None
+        self.matches = None  # filtered children in display order
+
+    def node(self):
+        # Looked up each time: a write may have copied the directory
+        node = self.fs.stat(self.path)
+        return node if node and node.is_dir else None
+
+    @staticmethod
+    def row(f):
+        files = f.file_count if f.is_dir else ""
+        modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(f.mtime))
+        quota = format_quota(f) if f.is_dir and f.quota else ""
+        return (f.name, "DIR" if f.is_dir else "FILE", f.size, files, modified, quota)
+
+    def refresh(self):
+        d = self.node()
+        if self.pattern is None or d is None:
+            self.matches = None
+            return
+        with self.fs.lock.read():
+            matches = [d.children[name] for name in self.fs._glob_names(d, self.pattern)]
+        if self.key != "name":
+            matches.sort(key=lambda f: File.sort_key(self.key, f))
+        if self.reverse:
+            matches.reverse()
+        self.matches = matches
+
+    def count(self):
+        if self.matches is not None:
+            return len(self.matches)
+        d = self.node()
+        return len(d.children) if d else 0
+
+    def rows(self, offset, limit):
+        if self.matches is not None:
+            page = self.matches[offset:offset + limit]
+        else:
+            page = self.fs.list_dir(self.path, self.key, offset, limit, self.reverse) if self.node() else []
+        return [(f.name, self.row(f)) for f in page]
+
+    def sort(self, column, reverse):
+        if column not in self.SORT_KEYS:
+            return False
+        self.key, self.reverse = self.SORT_KEYS[column], reverse
+        self.refresh()
+        return True
+
+    def filter(self, text):
+        text = text.strip()
+        self.pattern = None if not text else text if self.fs.has_magic(text) else f"*{text}*"
+        self.refresh()
+
 # =========================
 # V2.1 KERNEL (Unified)
 # =========================
 
-class OhiOS:
-    def __init__(self, root):
+START_PAGE = os.environ.get("OHIOS_START_PAGE", "https://example.com")
+
+class OhiOS(Kernel):
+    """The Tk desktop: a frontend over the headless Kernel."""
+    def __init__(self, root, start_page=START_PAGE):
         self.root = root
         self.wm = WindowManager(root)
-        
-        # Initialize v1 components
-        self.memory = Memory(2048)
-        self.process_manager = ProcessManager()
-        self.filesystem = FileSystem()
-        
+        self.start_page = start_page  # "" or about:blank opens the browser empty
+
+        Kernel.__init__(self)
+        boot_mark("kernel + history")
+
         root.title("ohiOS 2.1 Desktop")
         root.geometry("1200x700")
 
@@ -184,6 +3696,7 @@ class OhiOS:
             ("File Mgr", self.show_filesystem_window),
             ("Help", self.show_help),
             ("Reset", self.reset_system),
+            ("Monitor", self.show_monitor_window),
             ("About", self.show_about)
         ]
 
@@ -198,6 +3711,16 @@ class OhiOS:
         self.shell = tk.Text(left_frame, bg="black", fg="lime", height=20, width=50)
         self.shell.pack(fill="both", expand=True)
         self.shell.bind("<Return>", self.handle_command)
+        self.shell.bind("<Up>", lambda e: self.recall(-1))
+        self.shell.bind("<Down>", lambda e: self.recall(1))
+        self.shell.bind("<Tab>", self.complete_command)
+        self.shell.bind("<Control-r>", self.reverse_search)
+        self.shell.bind("<KeyPress>", self.search_key)
+        root.bind("<Escape>", lambda e: self.interrupt())
+        self.search_label = tk.Label(left_frame, anchor="w", bg="#333", fg="white")
+        self.completer = Completer(self.filesystem)
+        self.history_pos = len(self.history.entries)
+        self.search_state = None  # (query, entry number) while Ctrl-R is active
 
         right_frame = tk.Frame(root)
         right_frame.pack(side="right", fill="both", expand=True, padx=5, pady=5)
@@ -205,6 +3728,7 @@ class OhiOS:
         tk.Label(right_frame, text="GUI Output", bg="#333", fg="white").pack()
         self.gui = tk.Text(right_frame, bg="#111", fg="white", height=20, width=50)
         self.gui.pack(fill="both", expand=True)
+        self.output = OutputSink(root, self.gui)
 
         self.print_gui("Welcome to ohiOS 2.1")
         self.print_gui("Unified kernel with real memory & filesystem")
@@ -212,122 +3736,152 @@ class OhiOS:
         self.print_gui("")
         self.print_memory_info()
 
+        self.pump_events()
+        self.pump_jobs()
+        boot_mark("desktop")
+
     # =========================
     # Utility
     # =========================
     
     def print_gui(self, text):
-        self.gui.insert("end", text + "\n")
-        self.gui.see("end")
+        # Safe from any thread; the sink writes to the widget once per frame
+        self.output.write(text)
 
-    def print_memory_info(self):
-        info = self.memory.get_info()
-        self.print_gui(f"[MEM] {info['used']}/{info['total']} used | {info['free']} free")
+    def pump_jobs(self):
+        for job in self.drain_jobs():
+            for var in getattr(job, "waiters", ()):
+                var.set(True)
+        self.root.after(50, self.pump_jobs)
+
+    def wait_for(self, job):
+        """Block this command until job ends while Tk keeps running (and drains output)."""
+        if job.reported:
+            return
+        var = tk.BooleanVar(self.root, False)
+        job.waiters = getattr(job, "waiters", []) + [var]
+        self.root.wait_variable(var)
+        if job_cancelled():
+            raise JobCancelled()
+
+    def interrupt(self):
+        Kernel.interrupt(self)
+        for job in self.jobs.jobs.values():
+            for var in getattr(job, "waiters", []):
+                var.set(True)  # wakes wait_for, which then sees the interrupt
+
+    def pump_events(self):
+        self.filesystem.flush_events()
+        self.root.after(100, self.pump_events)
+
+    def update_ui(self):
+        if threading.current_thread() is threading.main_thread():
+            self.output.flush()
+            self.root.update_idletasks()
+
+    def poll_input(self):
+        # Commands run on the Tk thread; let Escape through while one does
+        if threading.current_thread() is threading.main_thread():
+            self.output.flush()
+            self.root.update()
+
+    def clear_output(self):
+        self.output.clear()
 
     # =========================
     # Shell Commands
     # =========================
     
     def handle_command(self, event):
+        self.end_search()
+        if self.foreground is not None:
+            self.print_gui("A command is running; press Escape to interrupt it.")
+            return "break"
         cmd = self.shell.get("1.0", "end-1c").strip()
         self.shell.delete("1.0", "end")
         if cmd:
+            self.history.add(cmd)
+            self.history_pos = len(self.history.entries)
             self.print_gui(f"shell://$ {cmd}")
             self.execute(cmd)
         return "break"
 
-    def execute(self, cmd):
-        parts = cmd.split()
-        if not parts:
-            return
-        
-        command = parts[0].lower()
+    def set_shell_text(self, text):
+        self.shell.delete("1.0", "end")
+        self.shell.insert("1.0", text)
 
-        try:
-            if command == "help":
-                self.show_help()
-            elif command == "ls":
-                for f in self.filesystem.list_dir():
-                    self.print_gui(f"{'[DIR]' if f.is_dir else '[FILE]'} {f.name} ({f.size}B)")
-            elif command == "mkfile":
-                if len(parts) > 1:
-                    result = self.filesystem.create_file(parts[1])
-                    self.print_gui("File created." if result else "Already exists.")
-                else:
-                    self.print_gui("Usage: mkfile <name>")
-            elif command == "write":
-                if len(parts) > 2:
-                    name = parts[1]
-                    content = " ".join(parts[2:])
-                    result = self.filesystem.write_file(name, content)
-                    self.print_gui("Written." if result else "Write failed.")
-                else:
-                    self.print_gui("Usage: write <name> <content>")
-            elif command == "read":
-                if len(parts) > 1:
-                    content = self.filesystem.read_file(parts[1])
-                    self.print_gui(content if content else "File not found.")
-                else:
-                    self.print_gui("Usage: read <name>")
-            elif command == "mkdir":
-                if len(parts) > 1:
-                    result = self.filesystem.mkdir(parts[1])
-                    self.print_gui("Directory created." if result else "Already exists.")
-                else:
-                    self.print_gui("Usage: mkdir <name>")
-            elif command == "delete":
-                if len(parts) > 1:
-                    result = self.filesystem.delete(parts[1])
-                    self.print_gui("Deleted." if result else "Not found.")
-                else:
-                    self.print_gui("Usage: delete <name>")
-            elif command == "mem":
-                info = self.memory.get_info()
-                self.print_gui(f"Memory: {info['used']}/{info['total']} used | {info['free']} free")
-            elif command == "ps":
-                procs = self.process_manager.list()
-                if not procs:
-                    self.print_gui("No running processes.")
-                else:
-                    for p in procs:
-                        addr_str = f"@0x{p.memory_start:04x}" if p.memory_start else "@0x?????"
-                        self.print_gui(f"{p.pid}: {p.name} [{p.memory_size}B] {addr_str}")
-            elif command == "python":
-                code = " ".join(parts[1:])
-                try:
-                    exec(code)
-                    self.print_gui("Code executed.")
-                except Exception as e:
-                    self.print_gui(f"Error: {e}")
-            elif command == "reset":
-                self.reset_system()
-            else:
-                self.print_gui(f"Unknown command: {command}")
-        except Exception as e:
-            self.print_gui(f"Error: {e}")
+    def recall(self, step):
+        entries = self.history.entries
+        self.history_pos = min(max(self.history_pos + step, 0), len(entries))
+        self.set_shell_text(entries[self.history_pos] if self.history_pos < len(entries) else "")
+        return "break"
+
+    def complete_command(self, event):
+        line = self.shell.get("1.0", "insert")
+        start, matches = self.completer.complete(line)
+        word = line[start:]
+        if not matches:
+            return "break"
+        common = os.path.commonprefix(matches)
+        if len(matches) == 1 and not common.endswith("/"):
+            common += " "
+        if len(common) > len(word):
+            self.shell.insert("insert", common[len(word):])
+        elif len(matches) > 1:
+            self.print_gui("  ".join(matches[:50]) + ("  ..." if len(matches) > 50 else ""))
+        return "break"
+
+    def reverse_search(self, event):
+        if self.search_state is None:
+            self.search_label.pack(fill="x")
+            self.show_search("", None)
+        else:
+            # Ctrl-R again: the next older match
+            query, n = self.search_state
+            self.show_search(query, self.history.search(query, n))
+        return "break"
+
+    def show_search(self, query, n):
+        if n is not None:
+            self.set_shell_text(self.history.entries[n])
+        self.search_state = (query, n)
+        failed = "" if n is not None or not query else "failed "
+        self.search_label.config(text=f"({failed}reverse-i-search)'{query}'")
+
+    def search_key(self, event):
+        if self.search_state is None or event.keysym in ("Return", "Tab") or event.state & 0x4:
+            return None
+        query = self.search_state[0]
+        if event.keysym == "Escape":
+            self.end_search()
+            self.set_shell_text("")
+        elif event.keysym == "BackSpace":
+            self.show_search(query[:-1], self.history.search(query[:-1]))
+        elif event.char and event.char.isprintable():
+            self.show_search(query + event.char, self.history.search(query + event.char))
+        else:
+            self.end_search()
+            return None
+        return "break"
+
+    def end_search(self):
+        if self.search_state is not None:
+            self.search_state = None
+            self.search_label.pack_forget()
 
     def show_help(self):
-        self.print_gui("--- Shell Commands ---")
-        self.print_gui("help - Show this help")
-        self.print_gui("ls - List directory")
-        self.print_gui("mkfile <name> - Create file")
-        self.print_gui("write <name> <content> - Write to file")
-        self.print_gui("read <name> - Read file")
-        self.print_gui("mkdir <name> - Create directory")
-        self.print_gui("delete <name> - Delete file/dir")
-        self.print_gui("mem - Show memory info")
-        self.print_gui("ps - List processes")
-        self.print_gui("python <code> - Execute Python code")
-        self.print_gui("reset - Reset system")
-
-    def reset_system(self):
-        self.shell.delete("1.0", "end")
-        self.gui.delete("1.0", "end")
-        self.memory = Memory(2048)
-        self.process_manager = ProcessManager()
-        self.filesystem = FileSystem()
-        self.print_gui("System Reset Complete")
-        self.print_gui("Welcome to ohiOS 2.1")
+        for line in commands.help_lines():
+            self.print_gui(line)
+
+    def reset_system(self, snapshot=None):
+        if snapshot is not None and snapshot not in self.filesystem.snapshots:
+            self.print_gui(f"No snapshot '{snapshot}'.")
+            return
+        if threading.current_thread() is threading.main_thread():
+            self.shell.delete("1.0", "end")  # a job leaves what is being typed alone
+        self.output.clear()
+        if Kernel.reset_system(self, snapshot):
+            self.print_gui("Welcome to ohiOS 2.1")
 
     def show_about(self):
         messagebox.showinfo("About", "ohiOS 2.1 Desktop\nHybrid OS Simulator\nv1 Internals + v2 UI")
@@ -337,79 +3891,163 @@ class OhiOS:
     # =========================
     
     def show_memory_window(self):
-        win = self.wm.open_window("Memory Manager", 600, 400)
-        
-        text = tk.Text(win, bg="#111", fg="white", font=("Courier", 10))
-        text.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        def refresh():
-            text.delete("1.0", "end")
+        win = self.wm.open_window("Memory Manager", 600, 560)
+
+        header = tk.Label(win, anchor="w", justify="left", font=("Courier", 10))
+        header.pack(fill="x", padx=10, pady=(10, 0))
+
+        def name(pid):
+            proc = self.process_manager.get(pid)
+            return proc.name if proc else f"PID{pid}"
+
+        memory_map = MemoryMap(win, lambda: self.memory, name)
+        memory_map.canvas.pack(padx=10, pady=5)
+
+        def allocations():
             info = self.memory.get_info()
-            text.insert("end", f"Total Memory: {info['total']} bytes\n")
-            text.insert("end", f"Used: {info['used']} bytes\n")
-            text.insert("end", f"Free: {info['free']} bytes\n")
-            text.insert("end", f"Usage: {(info['used']/info['total']*100):.1f}%\n\n")
-            text.insert("end", "Allocations:\n")
-            text.insert("end", "-" * 40 + "\n")
-            for pid, (addr, size) in self.memory.allocations.items():
-                proc = self.process_manager.get(pid)
-                proc_name = proc.name if proc else f"PID{pid}"
-                text.insert("end", f"0x{addr:04x}: {size:4d}B [{proc_name}]\n")
-        
-        refresh()
-        
-        tk.Button(win, text="Refresh", command=refresh).pack(pady=5)
+            header.config(text=f"Total: {info['total']} bytes  Used: {info['used']}  Free: {info['free']}  "
+                               f"Usage: {info['used'] / info['total'] * 100:.1f}%")
+            rows = []
+            for pid, (addr, size) in self.memory.snapshot().items():
+                overlap = " (overlaps)" if pid in memory_map.overlapping else ""
+                rows.append((pid, (f"0x{addr:04x}", size, pid, name(pid) + overlap)))
+            return rows
+
+        columns = ("address", "size", "pid", "process")
+        memory_map.refresh()
+        table = VirtualTable(win, ListSource(columns, allocations),
+                             list(zip(columns, ("Address", "Size", "PID", "Process"), (100, 80, 80, 250))))
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            # Memory.version makes an idle poll a single comparison
+            if memory_map.refresh():
+                table.refresh()
+            win.after(250, poll)
+
+        poll()
+        tk.Button(win, text="Refresh", command=table.refresh).pack(pady=5)
 
     # =========================
     # Process Window
     # =========================
-    
+
     def show_processes_window(self):
         win = self.wm.open_window("Process Manager", 600, 400)
-        
-        text = tk.Text(win, bg="#111", fg="white", font=("Courier", 10))
-        text.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        def refresh():
-            text.delete("1.0", "end")
-            procs = self.process_manager.list()
-            if not procs:
-                text.insert("end", "No running processes.\n")
-            else:
-                text.insert("end", f"{'PID':<6} {'Name':<20} {'Memory':<10} {'Address':<10}\n")
-                text.insert("end", "-" * 50 + "\n")
-                for p in procs:
-                    addr_str = f"0x{p.memory_start:04x}" if p.memory_start else "None"
-                    text.insert("end", f"{p.pid:<6} {p.name:<20} {p.memory_size:<10} {addr_str:<10}\n")
-        
-        refresh()
-        
-        tk.Button(win, text="Refresh", command=refresh).pack(pady=5)
+
+        def processes():
+            return [(p.pid, (p.pid, p.name, p.memory_size,
+                             f"0x{p.memory_start:04x}" if p.memory_start is not None else ""))
+                    for p in self.process_manager.list()]
+
+        columns = ("pid", "name", "memory", "address")
+        table = VirtualTable(win, ListSource(columns, processes),
+                             list(zip(columns, ("PID", "Name", "Memory", "Address"), (80, 250, 100, 100))))
+
+        tk.Button(win, text="Refresh", command=table.refresh).pack(pady=5)
 
     # =========================
     # Filesystem Window
     # =========================
-    
+
     def show_filesystem_window(self):
         win = self.wm.open_window("File Manager", 700, 500)
-        
-        text = tk.Text(win, bg="#111", fg="white", font=("Courier", 10))
-        text.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        def refresh():
-            text.delete("1.0", "end")
-            text.insert("end", "Current Directory: /\n")
-            text.insert("end", "-" * 50 + "\n")
-            text.insert("end", f"{'Type':<8} {'Name':<30} {'Size':<10}\n")
-            text.insert("end", "-" * 50 + "\n")
-            for f in self.filesystem.list_dir():
-                ftype = "DIR" if f.is_dir else "FILE"
-                text.insert("end", f"{ftype:<8} {f.name:<30} {f.size:<10}\n")
-        
-        refresh()
-        
+        fs = self.filesystem
+        path = fs.pwd()
+
+        header = tk.Label(win, anchor="w", justify="left", font=("Courier", 10))
+        header.pack(fill="x", padx=10, pady=(10, 0))
+
+        def update_header():
+            d = fs.stat(path)
+            if d is None:
+                header.config(text=f"Current Directory: {path} (removed)")
+                return
+            lines = [f"Current Directory: {path}",
+                     f"Total: {d.size} bytes in {d.file_count} files, {d.dir_count} dirs"]
+            if d.quota:
+                lines.append(f"Quota: {format_quota(d)}")
+            header.config(text="\n".join(lines))
+
+        columns = ("name", "type", "size", "files", "modified", "quota")
+        table = VirtualTable(win, DirectorySource(fs, path),
+                             list(zip(columns, ("Name", "Type", "Size", "Files", "Modified", "Quota"),
+                                      (200, 60, 90, 70, 130, 200))))
+
+        def refresh(events=None):
+            # Only the visible rows are rewritten, so every change can re-render
+            update_header()
+            table.refresh()
+
+        update_header()
+        wid = fs.watch(path, refresh)
+        win.bind("<Destroy>", lambda e: fs.unwatch(wid) if e.widget is win else None)
+
         tk.Button(win, text="Refresh", command=refresh).pack(pady=5)
 
+    # =========================
+    # System Monitor
+    # =========================
+
+    def show_monitor_window(self):
+        win = self.wm.open_window("System Monitor", 460, 330)
+        grid = tk.Frame(win)
+        grid.pack(fill="both", expand=True, padx=10, pady=10)
+
+        last = {"ops": self.filesystem.ops, "time": time.perf_counter(), "memory": None}
+
+        def sample():
+            info = self.memory.get_info()
+            # fragmentation() sorts every allocation; redo it only when they change
+            if (last["memory"], last.get("version")) != (self.memory, self.memory.version):
+                last.update(memory=self.memory, version=self.memory.version,
+                            fragmentation=self.memory.fragmentation())
+            fragmentation = last["fragmentation"]
+            now, ops = time.perf_counter(), self.filesystem.ops
+            rate = (ops - last["ops"]) / max(now - last["time"], 1e-6)
+            last.update(ops=ops, time=now)
+            return {
+                "Memory used": (info["used"], f"{info['used']} B"),
+                "Memory free": (info["free"], f"{info['free']} B"),
+                "Fragmentation": (fragmentation, f"{fragmentation * 100:.1f}%"),
+                "Processes": (len(self.process_manager.processes), str(len(self.process_manager.processes))),
+                "FS ops/sec": (rate, f"{rate:.1f}"),
+                "FS files": (self.filesystem.root.file_count, str(self.filesystem.root.file_count)),
+            }
+
+        cells = {}
+        for row, name in enumerate(sample()):
+            tk.Label(grid, text=name, anchor="w", width=14).grid(row=row, column=0, sticky="w")
+            value = tk.Label(grid, anchor="e", width=10, font=("Courier", 10))
+            value.grid(row=row, column=1, sticky="e", padx=5)
+            spark = Sparkline(grid)
+            spark.canvas.grid(row=row, column=2, pady=2)
+            cells[name] = (value, spark)
+
+        controls = tk.Frame(win)
+        controls.pack(fill="x", padx=10, pady=5)
+        tk.Label(controls, text="Interval (ms):").pack(side="left")
+        interval = tk.IntVar(value=1000)
+        tk.Spinbox(controls, from_=100, to=10000, increment=100, width=7, textvariable=interval).pack(side="left")
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            for name, (number, text) in sample().items():
+                value, spark = cells[name]
+                # Tk redraws a label on every config, so only touch changed cells
+                if value.cget("text") != text:
+                    value.config(text=text)
+                spark.add(number)
+            try:
+                delay = max(100, interval.get())
+            except tk.TclError:
+                delay = 1000  # the spinbox is being edited
+            win.after(delay, poll)
+
+        poll()
+
     # =========================
     # Applications
     # =========================
@@ -438,9 +4076,11 @@ class OhiOS:
 
         go_history = []
 
+        from tkinterweb import HtmlFrame
         frame = HtmlFrame(win, horizontal_scrollbar="auto")
         frame.pack(fill="both", expand=True)
-        frame.load_website("https://example.com")
+        if self.start_page not in ("", "about:blank"):
+            frame.load_website(self.start_page)
 
         def go_url(event=None):
             url = url_entry.get().strip()
@@ -552,6 +4192,51 @@ class OhiOS:
 # =========================
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="ohiOS 2.1 desktop")
+    parser.add_argument("--start-page", default=START_PAGE,
+                        help="page the browser opens with; about:blank for none")
+    parser.add_argument("--boot-profile", action="store_true",
+                        help="print where startup time went once the first frame is drawn")
+    parser.add_argument("--headless", action="store_true", help="run the kernel with a terminal shell, no Tk")
+    parser.add_argument("--serve", nargs="?", const="127.0.0.1:7023", metavar="HOST:PORT",
+                        help="serve shell sessions over TCP on one shared kernel (default 127.0.0.1:7023)")
+    parser.add_argument("--unix", metavar="PATH", help="with --serve, also listen on a Unix socket")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="with --serve, allow a non-loopback address; clients are not authenticated")
+    parser.add_argument("--stress", nargs="?", const=3.0, type=float, metavar="SECONDS",
+                        help="hammer a kernel from 8 threads, check its invariants and exit")
+    args = parser.parse_args()
+
+    if args.stress:
+        sys.exit(0 if stress_test(seconds=args.stress) else 1)
+
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        host = host or "127.0.0.1"
+        if not is_loopback(host) and not args.allow_remote:
+            parser.error(f"refusing to serve on {host}: anyone who can connect gets a shell; "
+                         "pass --allow-remote to do it anyway")
+        import asyncio
+        try:
+            asyncio.run(serve(Kernel(history_file=None), host, int(port), args.unix))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    if args.headless or tk is None:
+        if not args.headless:
+            print("tkinter is not available; starting the headless shell")
+        Shell(Kernel()).run()
+        sys.exit(0)
+
     root = tk.Tk()
-    app = OhiOS(root)
+    boot_mark("tk root")
+    app = OhiOS(root, start_page=args.start_page)
+    if args.boot_profile:
+        def report():
+            boot_mark("first frame")
+            for line in boot_report():
+                print(line)
+        root.after_idle(report)
     root.mainloop()